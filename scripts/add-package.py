@@ -1,18 +1,46 @@
 #!/usr/bin/env python3
 
 import argparse
+import gzip
 import json
+import os
 import re
+import sqlite3
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
+from urllib.parse import quote
 
 import requests
 import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import manifest
+import metrics
+import repodb
 
 # --- 全局配置 ---
-AUR_API_URL = "https://aur.archlinux.org/rpc.php"
-OFFICIAL_API_URL = "https://archlinux.org/packages/search/json/"
+# 两个接口地址都可以通过环境变量覆盖 (例如 benchmark.py 启动的本地桩服务)
+AUR_API_URL = os.environ.get("OUR_AUR_RPC_URL", "https://aur.archlinux.org/rpc.php")
+OFFICIAL_API_URL = os.environ.get("OUR_OFFICIAL_SEARCH_URL", "https://archlinux.org/packages/search/json/")
+# AUR RPC 允许的最大 URI 长度，批量查询时按此长度切分请求
+AUR_MAX_URI_LENGTH = 4443
+# 单个 HTTP 请求的超时时间 (秒)
+HTTP_TIMEOUT = 30
+# 本仓库构建环境额外启用的软件源配置 (entrypoint.sh 会将其追加到 /etc/pacman.conf)
+EXTRA_PACMAN_CONF = Path(__file__).resolve().parent.parent / "configs" / "pacman.conf"
+# 官方软件源在 pacman.conf 中的默认顺序，索引时靠前的仓库优先
+OFFICIAL_REPOS = ["core", "extra", "multilib"]
+# 持久缓存中各类查询结果的有效期 (秒)
+CACHE_TTLS = {
+    "aur_info": 6 * 3600,
+    "aur_provider": 6 * 3600,
+    "official": 24 * 3600,
+}
 
 HTTP_SESSION = requests.Session()
 HTTP_SESSION.headers.update({"User-Agent": "AUR-Dependency-Resolver/3.5-Optimized"})
@@ -22,6 +50,14 @@ HTTP_SESSION.headers.update({"User-Agent": "AUR-Dependency-Resolver/3.5-Optimize
 PROCESSED_PACKAGES_CACHE: dict[str, dict] = {}
 # 缓存官方源的查询结果，避免重复网络请求
 OFFICIAL_CACHE: dict[str, str | None] = {}
+# 缓存 AUR 包信息查询结果 (None 表示 AUR 中不存在)，父节点批量查到的信息可直接复用
+AUR_INFO_CACHE: dict[str, dict | None] = {}
+# 缓存 AUR provides 搜索结果
+AUR_PROVIDER_CACHE: dict[str, str | None] = {}
+
+
+class LookupFailedError(Exception):
+    """网络查询在多次重试后仍然失败. 此时无法判断包是否存在，不能当作 "找不到" 处理"""
 
 
 class NoAliasDumper(yaml.Dumper):
@@ -29,10 +65,263 @@ class NoAliasDumper(yaml.Dumper):
         return True
 
 
+class ResponseCache:
+    """
+    跨进程持久化的查询结果缓存，存放在 $XDG_CACHE_HOME 下的 sqlite 文件中.
+
+    每类查询 (kind) 有各自的有效期，过期的条目视为未命中. 查询可能在线程池中进行，
+    因此所有数据库操作都在同一把锁下完成.
+    """
+
+    def __init__(self, path: Path | None):
+        self.path = path
+        self.hits = {kind: 0 for kind in CACHE_TTLS}
+        self.misses = {kind: 0 for kind in CACHE_TTLS}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+            )
+            self._conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            print(f"[!] 无法打开缓存 '{path}'，本次不使用持久缓存: {e}", file=sys.stderr)
+            self._conn = None
+
+    def get(self, kind: str, key: str) -> tuple[bool, Any]:
+        """返回 (是否命中, 缓存值). 值本身可以是 None (表示 "不存在")"""
+        with self._lock:
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, fetched_at FROM responses WHERE kind = ? AND key = ?",
+                    (kind, key),
+                ).fetchone()
+            if row is None or time.time() - row[1] > CACHE_TTLS[kind]:
+                self.misses[kind] += 1
+                return False, None
+            self.hits[kind] += 1
+        return True, json.loads(row[0])
+
+    def set(self, kind: str, key: str, value: Any) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (kind, key, value, fetched_at) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(value), time.time()),
+            )
+            self._conn.commit()
+
+    def purge(self) -> None:
+        """清空所有缓存条目"""
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def print_stats(self) -> None:
+        for kind in CACHE_TTLS:
+            print(f"[i] 缓存 {kind}: 命中 {self.hits[kind]}, 未命中 {self.misses[kind]}")
+
+
+class OfficialIndex:
+    """
+    基于本地 pacman 同步数据库构建的内存索引，将 pkgname / provides / conflicts
+    映射到所属软件包，查询时无需任何网络请求.
+    """
+
+    def __init__(self, include_conflicts: bool = True):
+        self.include_conflicts = include_conflicts
+        self.by_name: dict[str, str] = {}
+        self.by_provides: dict[str, str] = {}
+        self.by_conflicts: dict[str, str] = {}
+        self.repos: list[str] = []
+
+    def add_db(self, db_path: Path) -> int:
+        """顺序流式读取一个同步数据库并加入索引，返回读取到的软件包数量"""
+        count = 0
+        for entry in repodb.iter_db_entries(db_path):
+            fields = entry.get("desc", {})
+            names = fields.get("NAME")
+            if not names:
+                continue
+            pkgname = names[0]
+            count += 1
+            # 按仓库顺序加入，先出现的仓库优先，与 pacman 的解析顺序一致
+            self.by_name.setdefault(pkgname, pkgname)
+            for provide in fields.get("PROVIDES", []):
+                self.by_provides.setdefault(clean_dependency_name(provide), pkgname)
+            if self.include_conflicts:
+                for conflict in fields.get("CONFLICTS", []):
+                    self.by_conflicts.setdefault(clean_dependency_name(conflict), pkgname)
+        self.repos.append(db_path.stem)
+        return count
+
+    def lookup(self, name: str) -> str | None:
+        """依次按包名、provides、conflicts 查找可以满足 name 的软件包"""
+        return (
+            self.by_name.get(name)
+            or self.by_provides.get(name)
+            or self.by_conflicts.get(name)
+        )
+
+
+class AURDump:
+    """
+    AUR 元数据转储 (packages-meta-ext-v1.json.gz) 的紧凑内存索引，
+    可在本地回答 info 查询和 provides 搜索.
+    """
+
+    # 解析依赖树只需要这些字段，其余字段丢弃以节省内存
+    KEEP_FIELDS = ("Name", "PackageBase", "Version", "Depends", "MakeDepends", "CheckDepends", "Provides")
+
+    def __init__(self):
+        self.by_name: dict[str, dict] = {}
+        self.by_provides: dict[str, str] = {}
+        self._provider_keys: dict[str, tuple] = {}
+
+    def add(self, pkg: dict) -> None:
+        name = pkg.get("Name")
+        if not name:
+            return
+        self.by_name[name] = {k: pkg[k] for k in self.KEEP_FIELDS if k in pkg}
+        key = _provider_sort_key(pkg)
+        # 多个包提供同一名称时的选择规则与在线查询 find_aur_provider 一致
+        for provide in pkg.get("Provides") or []:
+            provide = clean_dependency_name(provide)
+            if provide not in self._provider_keys or key < self._provider_keys[provide]:
+                self.by_provides[provide] = name
+                self._provider_keys[provide] = key
+
+    def info(self, package_names: list[str]) -> dict[str, dict]:
+        return {name: self.by_name[name] for name in package_names if name in self.by_name}
+
+    def provider(self, package_name: str) -> str | None:
+        return self.by_provides.get(package_name)
+
+
+def _provider_sort_key(pkg: dict) -> tuple:
+    """多个 AUR 包提供同一名称时，选择最受欢迎的一个；热度相同时按包名排序，保证结果确定"""
+    return (-(pkg.get("Popularity") or 0), pkg["Name"])
+
+
+def _iter_json_array(stream, chunk_size: int = 1 << 20):
+    """
+    流式解析顶层 JSON 数组，逐个产出元素，避免一次性载入整个转储.
+
+    数据在 ']' 之前结束 (例如下载被截断) 或不是数组时抛出 ValueError，
+    不能把截断的转储当作完整的 AUR 数据使用.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # 跳过空白、数组开头的 '[' 与元素之间的 ','
+        while pos < len(buffer) and (buffer[pos] in " \t\r\n," or (buffer[pos] == "[" and not started)):
+            started = started or buffer[pos] == "["
+            pos += 1
+        if pos < len(buffer) and not started:
+            raise ValueError("AUR 元数据转储不是 JSON 数组")
+        if started and buffer.startswith("]", pos):
+            return
+        if pos < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # 元素恰好在缓冲区末尾结束时 (例如被截断的数字)，先读入更多数据再确认
+                if end < len(buffer) or eof:
+                    yield item
+                    pos = end
+                    continue
+        if eof:
+            raise ValueError("AUR 元数据转储在 ']' 之前结束，文件可能被截断")
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        # 只在读入新数据时丢弃已解析的部分
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def load_aur_dump(dump_path: Path) -> AURDump:
+    """读取本地的 AUR 元数据转储 (.json 或 .json.gz)"""
+    dump = AURDump()
+    opener = gzip.open if dump_path.suffix == ".gz" else open
+    with opener(dump_path, "rt", encoding="utf-8") as f:
+        for pkg in _iter_json_array(f):
+            dump.add(pkg)
+    return dump
+
+
+def configured_repos(conf_path: Path) -> list[str]:
+    """读取 pacman.conf 中声明的软件源名称 (忽略 [options])"""
+    repos = []
+    try:
+        content = conf_path.read_text(encoding="utf-8")
+    except OSError:
+        return repos
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("[") and line.endswith("]") and line != "[options]":
+            repos.append(line[1:-1])
+    return repos
+
+
+def load_official_index(db_dir: Path, include_conflicts: bool = True) -> OfficialIndex:
+    """
+    从目录中的 *.db 文件构建官方源索引.
+
+    仓库顺序为 core, extra, multilib，然后是 configs/pacman.conf 中额外启用的
+    仓库 (如 archlinuxcn). 目录中的其他数据库 (例如本机启用的 our 仓库本身) 不参与索引,
+    否则本仓库自己的软件包会被当作官方替代品从依赖树中剔除.
+    """
+    db_files = {path.stem: path for path in sorted(db_dir.glob("*.db"))}
+    extra_repos = configured_repos(EXTRA_PACMAN_CONF)
+    order = OFFICIAL_REPOS + [r for r in extra_repos if r not in OFFICIAL_REPOS]
+    for repo in extra_repos:
+        if repo not in db_files:
+            print(
+                f"[!] 警告: '{EXTRA_PACMAN_CONF.name}' 启用了仓库 '{repo}'，但 '{db_dir}' 中没有它的数据库.",
+                file=sys.stderr,
+            )
+    if args.verbose:
+        for repo in db_files:
+            if repo not in order:
+                print(f"[i] 忽略非官方仓库 '{repo}' 的数据库")
+
+    index = OfficialIndex(include_conflicts)
+    for db_path in [db_files[r] for r in order if r in db_files]:
+        count = index.add_db(db_path)
+        if args.verbose:
+            print(f"[i] 已索引仓库 '{db_path.stem}': {count} 个软件包")
+    return index
+
+
+def default_cache_path() -> Path:
+    """遵循 XDG 规范的缓存文件路径"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "our" / "add-package.sqlite3"
+
+
 parser = argparse.ArgumentParser(
     description="为 AUR 软件包生成纯 AUR 依赖树，严格优先官方源软件包."
 )
-parser.add_argument("package_name", help="要分析其依赖关系的根 AUR 软件包的名称.")
+parser.add_argument(
+    "package_name", nargs="?", help="要分析其依赖关系的根 AUR 软件包的名称."
+)
 parser.add_argument(
     "--file",
     "-f",
@@ -41,83 +330,313 @@ parser.add_argument(
 parser.add_argument(
     "--verbose", "-v", action="store_true", default=False, help="打印更多信息."
 )
+parser.add_argument(
+    "--concurrency",
+    "-j",
+    type=int,
+    default=8,
+    help="并发 HTTP 请求数 (默认: 8).",
+)
+parser.add_argument(
+    "--retries",
+    type=int,
+    default=5,
+    help="遇到网络错误或 429/5xx 响应时的最大重试次数 (默认: 5).",
+)
+parser.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="不读取也不写入持久缓存, 所有数据都从网络获取.",
+)
+parser.add_argument(
+    "--purge-cache",
+    action="store_true",
+    help="开始解析前清空持久缓存.",
+)
+parser.add_argument(
+    "--cache-file",
+    type=Path,
+    default=default_cache_path(),
+    help="持久缓存文件路径 (默认: $XDG_CACHE_HOME/our/add-package.sqlite3).",
+)
+parser.add_argument(
+    "--sync-db-dir",
+    type=Path,
+    help="可选: 使用该目录下的 pacman 同步数据库 (*.db) 离线判断官方源替代品, "
+    "例如 /var/lib/pacman/sync. 只索引 core/extra/multilib 和 configs/pacman.conf 中的仓库. "
+    "省略时查询 archlinux.org.",
+)
+parser.add_argument(
+    "--match-conflicts",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="离线索引中是否将 conflicts 也视为可替代 (默认: 是, 与在线查询一致).",
+)
+parser.add_argument(
+    "--aur-dump",
+    type=Path,
+    help="可选: 本地的 AUR 元数据转储 (packages-meta-ext-v1.json.gz) 路径. "
+    "指定后 AUR 的 info 查询和 provides 搜索都在本地完成.",
+)
+parser.add_argument(
+    "--all",
+    "-a",
+    action="store_true",
+    help="在同一进程中重新解析 --file 清单中的所有根包 (共享缓存)，打印变化的依赖关系 (父包 -> 子包) 并就地更新.",
+)
+parser.add_argument(
+    "--compact",
+    action="store_true",
+    help="以紧凑形式 (nodes 表 + requires 引用) 写入 --file, 共享的子树只出现一次. "
+    "已是紧凑形式的清单总是保持紧凑形式.",
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="与 --all 一起使用: 只打印变化，不修改文件.",
+)
+metrics.add_arguments(parser)
 args = parser.parse_args()
 assert isinstance(args.verbose, bool)
+if args.all and not args.file:
+    parser.error("--all 需要同时指定 --file")
+if not args.all and not args.package_name:
+    parser.error("需要指定 package_name，或使用 --all")
+
+# 各接口的请求耗时、缓存命中等指标，由 --metrics-json 写出
+METRICS = metrics.Metrics("add-package")
+RESPONSE_CACHE = ResponseCache(None if args.no_cache else args.cache_file)
+if args.purge_cache:
+    RESPONSE_CACHE.purge()
+# 离线官方源索引，在 main() 中按需构建
+OFFICIAL_INDEX: OfficialIndex | None = None
+# 本地 AUR 元数据转储，在 main() 中按需加载
+AUR_DUMP: AURDump | None = None
+
+# 连接池大小与并发数一致；对 429/5xx 按指数退避自动重试，并遵守 Retry-After
+_adapter = HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=max(1, args.concurrency),
+    max_retries=Retry(
+        total=args.retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+        respect_retry_after_header=True,
+    ),
+)
+HTTP_SESSION.mount("https://", _adapter)
+HTTP_SESSION.mount("http://", _adapter)
+HTTP_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(1, args.concurrency), thread_name_prefix="http-worker"
+)
 
 # --- API 查询工具函数 ---
 
 
-def query_aur_info_batch(package_names: list[str]) -> dict[str, dict]:
-    """使用单次请求批量查询 AUR 获取多个软件包的信息"""
-    if not package_names:
-        return {}
-    params = [("v", "5"), ("type", "info")]
-    params.extend(("arg[]", name) for name in package_names)
+def _chunk_by_uri_length(package_names: list[str], base_length: int) -> list[list[str]]:
+    """将包名列表切分为多组，保证每组拼接出的查询 URI 不超过 AUR 的长度限制"""
+    chunks: list[list[str]] = []
+    current: list[str] = []
+    length = base_length
+    for name in package_names:
+        arg_length = len("&arg%5B%5D=") + len(quote(name, safe=""))
+        if current and length + arg_length > AUR_MAX_URI_LENGTH:
+            chunks.append(current)
+            current, length = [], base_length
+        current.append(name)
+        length += arg_length
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _get_json(url: str, params, endpoint: str) -> dict:
+    """
+    发出 GET 请求并解析 JSON. 重试耗尽后抛出 LookupFailedError
+
+    请求数和耗时 (包含自动重试) 按 endpoint 计入指标.
+    """
+    start = time.perf_counter()
     try:
-        response = HTTP_SESSION.get(AUR_API_URL, params=params)
+        response = HTTP_SESSION.get(url, params=params, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
-        return {pkg["Name"]: pkg for pkg in data.get("results", [])}
-    except (requests.RequestException, json.JSONDecodeError):
+        return response.json()
+    except (requests.RequestException, json.JSONDecodeError) as e:
+        METRICS.count(f"http.{endpoint}.errors")
+        raise LookupFailedError(f"请求 {url} 失败: {e}") from e
+    finally:
+        METRICS.observe(f"http.{endpoint}", time.perf_counter() - start)
+
+
+def run_concurrently(func, items) -> list:
+    """在共享线程池中并发执行查询函数，结果顺序与输入一致"""
+    items = list(items)
+    # 已在线程池中时直接顺序执行，避免工作线程等待自身线程池而死锁
+    in_worker = threading.current_thread().name.startswith("http-worker")
+    if len(items) <= 1 or in_worker:
+        return [func(item) for item in items]
+    return list(HTTP_EXECUTOR.map(func, items))
+
+
+def query_aur_info_batch(package_names: list[str]) -> dict[str, dict]:
+    """
+    批量查询 AUR 获取多个软件包的信息。
+
+    已缓存的包不再请求，其余的包按 URI 长度限制切分后并发请求.
+    """
+    if not package_names:
         return {}
+    if AUR_DUMP is not None:
+        METRICS.count("offline.aur_info", len(package_names))
+        return AUR_DUMP.info(package_names)
+    missing = []
+    for name in sorted(set(package_names)):
+        if name in AUR_INFO_CACHE:
+            METRICS.cache_hit("aur_info")
+            continue
+        hit, info = RESPONSE_CACHE.get("aur_info", name)
+        if hit:
+            METRICS.cache_hit("aur_info", "persistent")
+            AUR_INFO_CACHE[name] = info
+        else:
+            METRICS.cache_miss("aur_info")
+            missing.append(name)
+    base_length = len(AUR_API_URL) + len("?v=5&type=info")
+
+    def fetch(chunk: list[str]) -> None:
+        params = [("v", "5"), ("type", "info")]
+        params.extend(("arg[]", name) for name in chunk)
+        data = _get_json(AUR_API_URL, params, "aur_info")
+        results = {pkg["Name"]: pkg for pkg in data.get("results", [])}
+        for name in chunk:
+            AUR_INFO_CACHE[name] = results.get(name)
+            RESPONSE_CACHE.set("aur_info", name, results.get(name))
+        # 同时缓存返回的其他结果 (例如大小写不同的包名)
+        for name, pkg in results.items():
+            AUR_INFO_CACHE[name] = pkg
+
+    run_concurrently(fetch, _chunk_by_uri_length(missing, base_length))
+
+    return {
+        name: AUR_INFO_CACHE[name]
+        for name in package_names
+        if AUR_INFO_CACHE.get(name) is not None
+    }
 
 
 def find_aur_provider(package_name: str) -> str | None:
-    """在 AUR 中通过 provides 字段查找软件包"""
+    """在 AUR 中通过 provides 字段查找软件包，并缓存结果"""
+    if package_name in AUR_PROVIDER_CACHE:
+        METRICS.cache_hit("aur_provider")
+        return AUR_PROVIDER_CACHE[package_name]
+    if AUR_DUMP is not None:
+        METRICS.count("offline.aur_provider")
+        return AUR_DUMP.provider(package_name)
+    hit, provider = RESPONSE_CACHE.get("aur_provider", package_name)
+    if hit:
+        METRICS.cache_hit("aur_provider", "persistent")
+        AUR_PROVIDER_CACHE[package_name] = provider
+        return provider
+    METRICS.cache_miss("aur_provider")
+
     params = {"v": "5", "type": "search", "by": "provides", "arg": package_name}
-    try:
-        response = HTTP_SESSION.get(AUR_API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("resultcount", 0) > 0:
-            return data["results"][0]["Name"]
-        return None
-    except (requests.RequestException, json.JSONDecodeError):
-        return None
+    data = _get_json(AUR_API_URL, params, "aur_provider")
+
+    results = data.get("results") or []
+    provider = min(results, key=_provider_sort_key)["Name"] if results else None
+    AUR_PROVIDER_CACHE[package_name] = provider
+    RESPONSE_CACHE.set("aur_provider", package_name, provider)
+    return provider
+
+
+def _match_official(name: str, results: list[dict]) -> str | None:
+    """在官方源搜索结果中查找名称、provides 或 conflicts 与 name 匹配的包"""
+    for pkg_data in results:
+        if pkg_data["pkgname"] == name:
+            return pkg_data["pkgname"]
+
+        provides_list = pkg_data.get("provides", [])
+        cleaned_provides = [clean_dependency_name(p) for p in provides_list]
+        if name in cleaned_provides:
+            return pkg_data["pkgname"]
+
+        conflicts_list = pkg_data.get("conflicts", [])
+        cleaned_conflicts = [clean_dependency_name(c) for c in conflicts_list]
+        if name in cleaned_conflicts:
+            return pkg_data["pkgname"]
+    return None
 
 
 def find_official_alternative(package_name: str) -> str | None:
     """检查官方源中是否有任何包可以替代给定的包名，并缓存结果"""
     if package_name in OFFICIAL_CACHE:
+        METRICS.cache_hit("official")
         return OFFICIAL_CACHE[package_name]
+    if OFFICIAL_INDEX is not None:
+        METRICS.count("offline.official")
+        return _find_official_alternative_offline(package_name)
+    hit, alternative = RESPONSE_CACHE.get("official", package_name)
+    if hit:
+        METRICS.cache_hit("official", "persistent")
+        OFFICIAL_CACHE[package_name] = alternative
+        return alternative
+    METRICS.cache_miss("official")
+
+    # 各候选名称的搜索互不依赖，并发发出；匹配时仍按名称由长到短的优先级
+    names = _official_names_to_check(package_name)
+    responses = run_concurrently(lambda name: _get_json(OFFICIAL_API_URL, {"q": name}, "official"), names)
+    for name, data in zip(names, responses):
+        alternative = _match_official(name, data.get("results", []))
+        if alternative:
+            break
+    else:
+        alternative = None
 
+    OFFICIAL_CACHE[package_name] = alternative
+    RESPONSE_CACHE.set("official", package_name, alternative)
+    return alternative
+
+
+def _official_names_to_check(package_name: str) -> list[str]:
+    """需要在官方源中检查的名称：包名本身，以及去掉 -git/-bin 等后缀的基础名 (长名优先)"""
     names_to_check = {package_name}
     base_name = re.sub(r"(-git|-bin|-svn|-hg|-bzr|-testing|-debug)$", "", package_name)
     if base_name != package_name:
         names_to_check.add(base_name)
+    return sorted(names_to_check, key=len, reverse=True)
 
-    for name in sorted(list(names_to_check), key=len, reverse=True):
-        params = {"q": name}
-        try:
-            response = HTTP_SESSION.get(OFFICIAL_API_URL, params=params)
-            response.raise_for_status()
-            results = response.json().get("results", [])
-            if not results:
-                continue
 
-            for pkg_data in results:
-                if pkg_data["pkgname"] == name:
-                    OFFICIAL_CACHE[package_name] = pkg_data["pkgname"]
-                    return pkg_data["pkgname"]
-
-                provides_list = pkg_data.get("provides", [])
-                cleaned_provides = [clean_dependency_name(p) for p in provides_list]
-                if name in cleaned_provides:
-                    OFFICIAL_CACHE[package_name] = pkg_data["pkgname"]
-                    return pkg_data["pkgname"]
-
-                conflicts_list = pkg_data.get("conflicts", [])
-                cleaned_conflicts = [clean_dependency_name(c) for c in conflicts_list]
-                if name in cleaned_conflicts:
-                    OFFICIAL_CACHE[package_name] = pkg_data["pkgname"]
-                    return pkg_data["pkgname"]
-
-        except (requests.RequestException, json.JSONDecodeError) as e:
-            print(f"[!] 在官方源中搜索 '{name}' 时出错: {e}", file=sys.stderr)
-            continue
+def _find_official_alternative_offline(package_name: str) -> str | None:
+    """使用本地同步数据库索引查找官方源替代品"""
+    alternative = None
+    for name in _official_names_to_check(package_name):
+        alternative = OFFICIAL_INDEX.lookup(name)
+        if alternative:
+            break
+    OFFICIAL_CACHE[package_name] = alternative
+    return alternative
 
-    OFFICIAL_CACHE[package_name] = None
-    return None
+
+def prefetch_official_alternatives(package_names) -> None:
+    """并发查询一组依赖的官方源替代品，结果写入缓存"""
+    if OFFICIAL_INDEX is not None:
+        # 离线索引查询只是字典查找，无需线程池
+        return
+    run_concurrently(
+        find_official_alternative,
+        [name for name in package_names if name not in OFFICIAL_CACHE],
+    )
+
+
+def prefetch_aur_providers(package_names) -> None:
+    """并发进行一组依赖的 AUR provides 搜索，结果写入缓存"""
+    if AUR_DUMP is not None:
+        return
+    run_concurrently(
+        find_aur_provider,
+        [name for name in package_names if name not in AUR_PROVIDER_CACHE],
+    )
 
 
 # --- 核心逻辑 ---
@@ -128,88 +647,130 @@ def clean_dependency_name(dep: str) -> str:
     return re.split(r"[<>=]", dep, maxsplit=1)[0].strip()
 
 
-def build_aur_dependency_tree(package_name: str) -> dict[str, Any] | None:
-    """(优化) 为那些没有官方替代品的 AUR 包构建依赖树"""
-    if package_name in PROCESSED_PACKAGES_CACHE:
-        return PROCESSED_PACKAGES_CACHE[package_name]
-
-    print(f"\n[->] 正在分析 AUR 包: {package_name}")
-
-    # 初始包信息仍需单独获取
-    pkg_info_map = query_aur_info_batch([package_name])
-    if package_name not in pkg_info_map:
-        print(f"[!] 警告: 在 AUR 中找不到包 '{package_name}'，可能已被移除或重命名.")
-        return None
-    pkg_info = pkg_info_map[package_name]
-
-    node: dict[str, Any] = {"name": package_name}
-    PROCESSED_PACKAGES_CACHE[package_name] = node
-
+def _resolve_aur_dependencies(
+    pkg_info: dict, aur_candidates: set[str], aur_info_map: dict[str, dict]
+) -> list[str]:
+    """将一个包的依赖解析为实际需要构建的 AUR 包名列表 (按依赖名排序)"""
     all_deps: set[str] = set()
     for dep_type in ["Depends", "MakeDepends", "CheckDepends"]:
         all_deps.update(pkg_info.get(dep_type, []))
 
-    if not all_deps:
-        if args.verbose:
-            print(f"[i] 包 '{package_name}' 没有需要分析的 AUR 依赖.")
-        return node
-
-    # 1. 清理并收集所有唯一的依赖名称
-    cleaned_deps = {
-        clean_dependency_name(d) for d in all_deps if clean_dependency_name(d)
-    }
-
-    # 2. 批量过滤掉在官方源中存在的依赖
-    aur_candidates = set()
-    for dep in cleaned_deps:
-        official_alternative = find_official_alternative(dep)  # 使用了缓存
-        if official_alternative:
-            if args.verbose:
-                print(f"[i] 依赖 '{dep}' 由官方包 '{official_alternative}' 满足. 跳过.")
-        else:
-            aur_candidates.add(dep)
-
-    if not aur_candidates:
-        return node
-
-    # 3. 对剩余的 AUR 候选包进行一次批量信息查询
-    aur_info_map = query_aur_info_batch(list(aur_candidates))
-
-    aur_dependencies: list[dict] = []
-    # 4. 遍历原始排序的依赖列表以保持顺序和处理 provides
-    for dep in sorted(list(all_deps)):
+    resolved: list[str] = []
+    # 遍历原始排序的依赖列表以保持顺序和处理 provides
+    for dep in sorted(all_deps):
         cleaned_dep = clean_dependency_name(dep)
         if not cleaned_dep or cleaned_dep not in aur_candidates:
             continue
 
         actual_aur_pkg_name = None
-        # 4a. 检查批量获取的结果中是否有直接匹配
+        # 检查批量获取的结果中是否有直接匹配
         if cleaned_dep in aur_info_map:
             actual_aur_pkg_name = cleaned_dep
         else:
-            # 4b. 如果直接匹配失败，再单独查询 provides (这是无法批量化的)
+            # 如果直接匹配失败，再单独查询 provides (这是无法批量化的)
             provider_pkg = find_aur_provider(cleaned_dep)
             if provider_pkg and not find_official_alternative(provider_pkg):
                 actual_aur_pkg_name = provider_pkg
 
-        if actual_aur_pkg_name and args.verbose:
+        if not actual_aur_pkg_name:
+            print(f"[!] 警告: 依赖 '{cleaned_dep}' 在官方源和AUR中都找不到. 跳过.")
+            continue
+
+        if args.verbose:
             if actual_aur_pkg_name == cleaned_dep:
                 print(f"[+] 发现纯 AUR 依赖: '{cleaned_dep}'")
             else:
                 print(
                     f"[+] 发现纯 AUR 依赖: '{cleaned_dep}' (由 AUR 包 '{actual_aur_pkg_name}' 提供)"
                 )
+        if actual_aur_pkg_name not in resolved:
+            resolved.append(actual_aur_pkg_name)
 
-            subtree = build_aur_dependency_tree(actual_aur_pkg_name)
-            if subtree:
-                aur_dependencies.append(subtree)
-        else:
-            print(f"[!] 警告: 依赖 '{cleaned_dep}' 在官方源和AUR中都找不到. 跳过.")
+    return resolved
+
+
+def build_aur_dependency_tree(package_name: str) -> dict[str, Any] | None:
+    """
+    (优化) 为那些没有官方替代品的 AUR 包构建依赖树.
+
+    按层广度优先解析：同一层所有包的 AUR 候选依赖合并为一次批量信息查询，
+    查到的信息缓存起来供下一层直接使用，因此每层大约只需一次 AUR 往返.
+    """
+    if package_name in PROCESSED_PACKAGES_CACHE:
+        return PROCESSED_PACKAGES_CACHE[package_name]
+
+    # 每个新节点按依赖顺序解析出的子包名，全部层处理完后再挂载子节点
+    children: dict[str, list[str]] = {}
+    level = [package_name]
+
+    while level:
+        # 1. 获取本层包的信息 (通常已由上一层的批量查询缓存)
+        pkg_info_map = query_aur_info_batch(level)
+
+        new_nodes: list[tuple[str, dict]] = []
+        for name in level:
+            if name in PROCESSED_PACKAGES_CACHE:
+                continue
+            print(f"\n[->] 正在分析 AUR 包: {name}")
+            if name not in pkg_info_map:
+                print(f"[!] 警告: 在 AUR 中找不到包 '{name}'，可能已被移除或重命名.")
+                continue
+            PROCESSED_PACKAGES_CACHE[name] = {"name": name}
+            new_nodes.append((name, pkg_info_map[name]))
+
+        # 2. 清理并收集本层所有唯一的依赖名称
+        cleaned_deps: set[str] = set()
+        for name, pkg_info in new_nodes:
+            deps = [
+                clean_dependency_name(d)
+                for dep_type in ["Depends", "MakeDepends", "CheckDepends"]
+                for d in pkg_info.get(dep_type, [])
+            ]
+            if not any(deps) and args.verbose:
+                print(f"[i] 包 '{name}' 没有需要分析的 AUR 依赖.")
+            cleaned_deps.update(d for d in deps if d)
+
+        # 3. 过滤掉在官方源中存在的依赖 (本层所有依赖并发查询)
+        prefetch_official_alternatives(cleaned_deps)
+        aur_candidates = set()
+        for dep in sorted(cleaned_deps):
+            official_alternative = find_official_alternative(dep)  # 使用了缓存
+            if official_alternative:
+                if args.verbose:
+                    print(f"[i] 依赖 '{dep}' 由官方包 '{official_alternative}' 满足. 跳过.")
+            else:
+                aur_candidates.add(dep)
+
+        # 4. 对本层剩余的 AUR 候选包进行一次批量信息查询
+        aur_info_map = query_aur_info_batch(list(aur_candidates))
+
+        # 未直接命中的候选包需要 provides 搜索，同样并发进行
+        unmatched = aur_candidates - aur_info_map.keys()
+        prefetch_aur_providers(unmatched)
+        prefetch_official_alternatives(
+            AUR_PROVIDER_CACHE[dep] for dep in unmatched if AUR_PROVIDER_CACHE.get(dep)
+        )
 
-    if aur_dependencies:
-        node["dependencies"] = aur_dependencies
+        # 5. 解析每个新节点的实际 AUR 依赖，作为下一层
+        next_level: list[str] = []
+        for name, pkg_info in new_nodes:
+            children[name] = _resolve_aur_dependencies(pkg_info, aur_candidates, aur_info_map)
+            for child in children[name]:
+                if child not in PROCESSED_PACKAGES_CACHE and child not in next_level:
+                    next_level.append(child)
+        level = next_level
 
-    return node
+    # 挂载子节点，共享的子树使用同一个节点对象
+    for name, child_names in children.items():
+        dependencies = [
+            PROCESSED_PACKAGES_CACHE[child]
+            for child in child_names
+            if child in PROCESSED_PACKAGES_CACHE
+        ]
+        if dependencies:
+            PROCESSED_PACKAGES_CACHE[name]["dependencies"] = dependencies
+
+    return PROCESSED_PACKAGES_CACHE.get(package_name)
 
 
 def print_pretty_tree(node: dict[str, Any], prefix: str = "", is_last: bool = True):
@@ -228,10 +789,294 @@ def print_pretty_tree(node: dict[str, Any], prefix: str = "", is_last: bool = Tr
             print_pretty_tree(child, prefix=children_prefix, is_last=is_child_last)
 
 
+# --- 清单整体重新解析 ---
+
+# 依赖树中由解析器维护的键，其余键 (lto, exclude, env, base 等) 为手工配置，需要保留
+RESOLVER_KEYS = {"name", "dependencies"}
+ROOT_LINE_RE = re.compile(r"^- name:\s*([^\s#]+)")
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _merge_dependencies(old_deps, new_deps: list[dict], known=None, merged=None) -> list:
+    """
+    用新解析出的依赖替换旧的依赖列表.
+
+    旧列表中的字符串条目是手工添加的额外依赖 (构建时通过 yay 安装)，原样保留；
+    字典条目由解析器维护，替换为新结果，但保留同名旧节点上的手工配置键.
+    旧节点先在同一位置的旧依赖中查找，找不到时再查 known (包名 -> 旧节点)，
+    紧凑清单中每个包只有一份配置，因此传入整个清单的节点索引.
+
+    同一个旧节点与同名新节点的合并结果缓存在 merged 中，只生成一次并共享，
+    因此开销与不同软件包的数量成线性关系，而不是与依赖树中的路径数成正比.
+    """
+    if merged is None:
+        merged = {}
+    old_nodes = {dep["name"]: dep for dep in _as_list(old_deps) if isinstance(dep, dict)}
+    new_names = {node["name"] for node in new_deps}
+    result: list = [
+        dep for dep in _as_list(old_deps) if isinstance(dep, str) and dep not in new_names
+    ]
+    for node in new_deps:
+        name = node["name"]
+        old_node = old_nodes.get(name) or (known or {}).get(name)
+        key = (id(old_node) if old_node is not None else None, name)
+        if key not in merged:
+            # 生成新的字典，不修改 PROCESSED_PACKAGES_CACHE 中共享的节点
+            new_node: dict[str, Any] = {"name": name}
+            merged[key] = new_node
+            old_node = old_node or {}
+            children = _merge_dependencies(
+                old_node.get("dependencies"), node.get("dependencies", []), known, merged
+            )
+            if children:
+                new_node["dependencies"] = children
+            new_node.update((k, v) for k, v in old_node.items() if k not in RESOLVER_KEYS)
+        result.append(merged[key])
+    return result
+
+
+def _dependency_edges(deps, parent: str) -> set[tuple[str, str]]:
+    """将依赖树展开为 (父包, 子包) 边的集合，用于比较两棵树；共享的节点只展开一次"""
+    edges: set[tuple[str, str]] = set()
+    expanded: set[int] = set()
+    stack = [(parent, deps)]
+    while stack:
+        parent, deps = stack.pop()
+        for dep in _as_list(deps):
+            if not isinstance(dep, dict):
+                edges.add((parent, str(dep)))
+                continue
+            edges.add((parent, dep["name"]))
+            if id(dep) not in expanded:
+                expanded.add(id(dep))
+                stack.append((dep["name"], dep.get("dependencies")))
+    return edges
+
+
+def _index_nodes(forest: list[dict]) -> dict[str, dict]:
+    """按包名索引依赖森林中的字典节点 (同名时保留第一个)，每个节点对象只访问一次"""
+    nodes: dict[str, dict] = {}
+    visited: set[int] = set()
+    stack = list(reversed(forest))
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        nodes.setdefault(node["name"], node)
+        stack.extend(reversed([d for d in _as_list(node.get("dependencies")) if isinstance(d, dict)]))
+    return nodes
+
+
+def _render_block(key: str, value: list, indent: str = "  ") -> list[str]:
+    """以与清单一致的风格 (默认缩进两格) 输出 "key: 列表" 块的文本行"""
+    if not value:
+        return []
+    text = yaml.dump(
+        {key: value},
+        Dumper=NoAliasDumper,
+        indent=2,
+        sort_keys=False,
+        allow_unicode=True,
+    )
+    return [indent + line for line in text.splitlines()]
+
+
+def _replace_root_blocks(lines: list[str], updates: dict[str, list], key: str) -> list[str]:
+    """
+    只替换发生变化的根包的 key 块 (dependencies 或 requires)，文件其余部分 (包括注释) 保持原样.
+    """
+    result: list[str] = []
+    i = 0
+    while i < len(lines):
+        match = ROOT_LINE_RE.match(lines[i])
+        if not match or match.group(1) not in updates:
+            result.append(lines[i])
+            i += 1
+            continue
+
+        # 根包的块一直延续到下一个顶格的非空行
+        end = i + 1
+        while end < len(lines) and (not lines[end].strip() or lines[end].startswith(" ")):
+            end += 1
+        while end > i + 1 and not lines[end - 1].strip():
+            end -= 1
+        block = lines[i + 1 : end]
+
+        # 在块中定位 "  key:" 及其列表项
+        key_start = next(
+            (j for j, line in enumerate(block) if line.startswith(f"  {key}:")), None
+        )
+        new_lines = _render_block(key, updates[match.group(1)])
+        if key_start is None:
+            block = new_lines + block
+        else:
+            key_end = key_start + 1
+            while key_end < len(block) and (
+                block[key_end].startswith("  - ")
+                or block[key_end].startswith("   ")
+                or not block[key_end].strip()
+            ):
+                key_end += 1
+            block = block[:key_start] + new_lines + block[key_end:]
+
+        result.append(lines[i])
+        result.extend(block)
+        i = end
+    return result
+
+
+def _replace_top_level_block(lines: list[str], key: str, value: list) -> list[str]:
+    """替换 (或追加) 顶层的 "key:" 块，例如紧凑清单中由程序维护的 nodes 表"""
+    new_lines = _render_block(key, value, indent="")
+    start = next((i for i, line in enumerate(lines) if line.startswith(f"{key}:")), None)
+    if start is None:
+        return lines + new_lines
+    end = start + 1
+    while end < len(lines) and not re.match(r"^[^\s#-]", lines[end]):
+        end += 1
+    return lines[:start] + new_lines + lines[end:]
+
+
+def write_manifest(yaml_file: Path, data: dict, forest: list[dict], compact: bool) -> None:
+    """
+    将依赖森林写回清单文件，compact 为 True 时使用紧凑形式.
+
+    Raises:
+        ValueError: 同一个包在森林中有多份不同的配置，无法写成紧凑形式.
+    """
+    if compact:
+        data.update(manifest.compact(forest))
+    else:
+        data.pop("nodes", None)
+        data["packages"] = forest
+    with open(yaml_file, "w", encoding="utf-8") as f:
+        yaml.dump(
+            data,
+            f,
+            Dumper=NoAliasDumper,
+            indent=2,
+            sort_keys=False,
+            allow_unicode=True,
+        )
+
+
+def reresolve_manifest(yaml_file: Path) -> None:
+    """重新解析清单中的所有根包，打印变化的子树，并只更新变化的部分"""
+    try:
+        text = yaml_file.read_text(encoding="utf-8")
+        data = yaml.safe_load(text)
+    except (OSError, yaml.YAMLError) as e:
+        print(f"[!] 无法读取清单 '{yaml_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+    if not isinstance(data, dict) or not isinstance(data.get("packages"), list):
+        print(f"[!] 清单 '{yaml_file}' 必须包含名为 'packages' 的顶层列表.", file=sys.stderr)
+        sys.exit(1)
+
+    compact = manifest.is_compact(data)
+    roots = manifest.load_forest(data)
+    # 要求转换为紧凑形式时，即使依赖树没有变化也需要重写文件
+    convert = args.compact and not compact
+    # 紧凑形式中每个包只有一份配置，新出现在其他位置的依赖也沿用它
+    known = _index_nodes(roots) if compact or convert else None
+    # 先并发预取所有根包 (以及 base 包) 的信息和官方源状态，再逐个解析
+    root_names = [root.get("base") or root["name"] for root in roots]
+    with METRICS.phase("prefetch_roots"):
+        prefetch_official_alternatives(root_names)
+        query_aur_info_batch(root_names)
+
+    updates: dict[str, list] = {}
+    for root, lookup_name in zip(roots, root_names):
+        name = root["name"]
+        if find_official_alternative(lookup_name):
+            print(f"[!] 警告: 根包 '{name}' 可由官方源满足，跳过.")
+            continue
+        with METRICS.phase("resolve"):
+            tree = build_aur_dependency_tree(lookup_name)
+        if tree is None:
+            print(f"[!] 警告: 无法解析根包 '{name}'，保持原样.")
+            continue
+
+        new_deps = _merge_dependencies(root.get("dependencies"), tree.get("dependencies", []), known)
+        old_edges = _dependency_edges(root.get("dependencies"), name)
+        new_edges = _dependency_edges(new_deps, name)
+        if old_edges == new_edges:
+            continue
+
+        updates[name] = new_deps
+        print(f"\n[~] {name}")
+        for parent, child in sorted(new_edges - old_edges):
+            print(f"    + {parent} -> {child}")
+        for parent, child in sorted(old_edges - new_edges):
+            print(f"    - {parent} -> {child}")
+
+    if not updates and not convert:
+        print(f"\n[✓] 已重新解析 {len(roots)} 个根包，'{yaml_file}' 无需更新.")
+        return
+    if args.dry_run:
+        print(f"\n[i] {len(updates)} 个根包的依赖树有变化 (--dry-run，未修改文件).")
+        return
+
+    new_forest = [
+        dict(root, dependencies=updates[root["name"]]) if root["name"] in updates else root
+        for root in roots
+    ]
+    if compact or convert:
+        try:
+            compacted = manifest.compact(new_forest)
+        except ValueError as e:
+            print(f"[!] 无法写入紧凑形式的清单 '{yaml_file}': {e}", file=sys.stderr)
+            sys.exit(1)
+    if compact:
+        # 紧凑清单: 更新变化根包的 requires 引用，并重新生成由程序维护的 nodes 表
+        requires = {
+            node["name"]: node.get("requires", [])
+            for node in compacted["packages"]
+            if node["name"] in updates
+        }
+        lines = _replace_root_blocks(text.splitlines(), requires, "requires")
+        lines = _replace_top_level_block(lines, "nodes", compacted["nodes"])
+        yaml_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    elif convert:
+        print(f"[i] 将 '{yaml_file}' 转换为紧凑形式 (注释不会保留).")
+        write_manifest(yaml_file, data, new_forest, compact=True)
+    else:
+        lines = _replace_root_blocks(text.splitlines(), updates, "dependencies")
+        yaml_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    print(f"\n[✓] 已更新 '{yaml_file}' 中 {len(updates)} 个根包的依赖树.")
+
+
 def main():
+    global OFFICIAL_INDEX, AUR_DUMP
+    if args.aur_dump:
+        try:
+            with METRICS.phase("load_aur_dump"):
+                AUR_DUMP = load_aur_dump(args.aur_dump)
+        except (OSError, EOFError, ValueError) as e:
+            print(f"[!] 无法读取 AUR 元数据转储 '{args.aur_dump}': {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.verbose:
+            print(f"[i] 已从 AUR 元数据转储加载 {len(AUR_DUMP.by_name)} 个软件包")
+    if args.sync_db_dir:
+        if not args.sync_db_dir.is_dir():
+            print(f"[!] 同步数据库目录 '{args.sync_db_dir}' 不存在.", file=sys.stderr)
+            sys.exit(1)
+        with METRICS.phase("load_official_index"):
+            OFFICIAL_INDEX = load_official_index(args.sync_db_dir, args.match_conflicts)
+
+    if args.all:
+        reresolve_manifest(Path(args.file))
+        return
+
     if args.verbose:
         print(f"[?] 检查根包 '{args.package_name}' 是否有官方源替代品...")
-    official_alternative = find_official_alternative(args.package_name)
+    with METRICS.phase("resolve"):
+        official_alternative = find_official_alternative(args.package_name)
 
     if official_alternative:
         print(
@@ -243,7 +1088,8 @@ def main():
     if args.verbose:
         print(f"[i] '{args.package_name}' 没有直接的官方替代品, 开始构建纯 AUR 依赖树...")
 
-    dependency_tree = build_aur_dependency_tree(args.package_name)
+    with METRICS.phase("resolve"):
+        dependency_tree = build_aur_dependency_tree(args.package_name)
 
     if not dependency_tree:
         print(f"\n[!] 未能为 '{args.package_name}' 构建依赖树.", file=sys.stderr)
@@ -261,26 +1107,27 @@ def main():
                 except (yaml.YAMLError, ValueError):
                     pass
 
-        existing_packages = [pkg["name"] for pkg in data_to_write.get("packages", [])]
+        compact = args.compact or manifest.is_compact(data_to_write)
+        forest = manifest.load_forest(data_to_write)
+        existing_packages = [pkg["name"] for pkg in forest]
         if args.package_name in existing_packages:
             print(
                 f"\n[!] 警告: 包 '{args.package_name}' 已存在于 '{yaml_file}' 中.无需操作."
             )
             sys.exit(0)
 
-        data_to_write.setdefault("packages", []).append(dependency_tree)
+        if compact:
+            # 紧凑形式中每个包只有一份配置，新依赖树中已在清单里出现的包沿用已有的配置
+            dependency_tree = _merge_dependencies(None, [dependency_tree], _index_nodes(forest))[0]
+        forest.append(dependency_tree)
 
-        data_to_write["packages"].sort(key=lambda pkg: pkg["name"])
+        forest.sort(key=lambda pkg: pkg["name"])
 
-        with open(yaml_file, "w", encoding="utf-8") as f:
-            yaml.dump(
-                data_to_write,
-                f,
-                Dumper=NoAliasDumper,
-                indent=2,
-                sort_keys=False,
-                allow_unicode=True,
-            )
+        try:
+            write_manifest(yaml_file, data_to_write, forest, compact)
+        except ValueError as e:
+            print(f"\n[!] 无法写入紧凑形式的清单 '{yaml_file}': {e}", file=sys.stderr)
+            sys.exit(1)
         print(
             f"\n[✓] 成功将 '{args.package_name}' 的纯 AUR 依赖树更新到 '{yaml_file}'!"
         )
@@ -299,4 +1146,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        with metrics.instrument(args, METRICS):
+            main()
+    except LookupFailedError as e:
+        print(f"\n[!] 网络查询失败, 无法确定依赖关系, 已中止: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.verbose:
+            RESPONSE_CACHE.print_stats()
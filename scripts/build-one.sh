@@ -15,10 +15,10 @@ echo "Root directory set to: $ROOT_DIR"
 echo "Packages to build: $@"
 echo # 添加一个空行以提高可读性
 
-# --- 核心构建循环 ---
-# 使用 for 循环遍历所有传递给脚本的参数 ("$@")。
-# "$@" 会将每个参数作为一个独立的字符串处理，即使参数名中包含空格。
-for REPO in "$@"; do
+# --- 单个包的构建 ---
+# 在子 shell 中调用，set -e 仍然生效，但一个包失败只会结束它自己的子 shell。
+build_package() {
+    REPO="$1"
     echo "================================================="
     echo "Processing package: $REPO"
     echo "================================================="
@@ -134,11 +134,40 @@ for REPO in "$@"; do
 
     echo "--- Successfully processed package: $REPO ---"
     echo # 添加一个空行以提高可读性
+}
 
+# --- 核心构建循环 ---
+# 使用 for 循环遍历所有传递给脚本的参数 ("$@")。
+# "$@" 会将每个参数作为一个独立的字符串处理，即使参数名中包含空格。
+# 合并构建分片时有多个包，一个包失败后继续构建分片中的其余包，最后再以失败状态退出。
+FAILED=()
+for REPO in "$@"; do
+    START=$SECONDS
+    # 子 shell 不能放在 if 或 || 中，否则其中的 set -e 会被忽略
+    set +e
+    (set -e; build_package "$REPO")
+    STATUS=$?
+    set -e
+    cd "$ROOT_DIR"
+
+    # 每个包的构建耗时，可整理为 list-tasks.py --history 使用的耗时历史
+    echo "--- Build time for '$REPO': $((SECONDS - START))s (exit status $STATUS) ---"
+    if [ "$STATUS" -ne 0 ]; then
+        echo "!!! Build for '$REPO' failed with exit status $STATUS."
+        FAILED+=("$REPO")
+    fi
 done
 
 echo "================================================="
-echo "All packages built successfully!"
+if [ "${#FAILED[@]}" -ne 0 ]; then
+    echo "Failed packages: ${FAILED[*]}"
+else
+    echo "All packages built successfully!"
+fi
 echo "Final packages in root directory:"
-ls -l *.pkg.tar
-echo "================================================="
\ No newline at end of file
+ls -l *.pkg.tar 2>/dev/null || true
+echo "================================================="
+
+if [ "${#FAILED[@]}" -ne 0 ]; then
+    exit 1
+fi
\ No newline at end of file
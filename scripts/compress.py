@@ -0,0 +1,230 @@
+"""
+对构建产物 (*.pkg.tar) 进行 zstd 压缩，替代 entrypoint.sh 中对每个包统一使用 `zstd --ultra -22` 的做法。
+
+- 通过 python-zstandard 流式压缩，并按文件大小设置多线程任务大小，使大文件也能用满所有核心；
+- 压缩级别按文件大小和总的时间预算选择：小文件不使用 ultra 级别，
+  大文件在预算内选择尽可能高的级别，并根据已压缩文件的实测速度校正估计；
+- 每个文件的级别、压缩比、吞吐量写入 JSON 报告。
+
+--bench 模式在样本目录上比较不同级别的压缩比和速度，用于校准级别选择。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import zstandard
+
+MIB = 1024 * 1024
+# 各级别单线程压缩速度的粗略估计 (MiB/s)，只用于在预算内选择级别，实际速度会在运行中校正
+LEVEL_SPEEDS = {3: 200, 6: 70, 9: 45, 12: 25, 15: 8, 17: 4, 19: 2.5, 20: 2, 21: 1.6, 22: 1.3}
+MIN_LEVEL = 3
+MAX_LEVEL = 22
+# 小于该大小的包使用 ultra 级别几乎没有收益
+SMALL_FILE_SIZE = 1 * MIB
+SMALL_FILE_MAX_LEVEL = 19
+# zstd 默认的多线程任务大小随窗口增大，高级别下几乎退化为单线程，这里按线程数切分输入
+MIN_JOB_SIZE = 32 * MIB
+DEFAULT_BUDGET = 1800
+DEFAULT_BENCH_LEVELS = "3,9,15,19,22"
+
+
+def job_size_for(size, threads):
+    """让每个线程分到一个任务，但任务不小于 MIN_JOB_SIZE，以免压缩比明显下降"""
+    return max(MIN_JOB_SIZE, -(-size // max(1, threads)))
+
+
+def estimate_seconds(size, level, threads, speed_factor=1.0):
+    """估计以给定级别压缩 size 字节所需的时间"""
+    jobs = max(1, min(threads, -(-size // job_size_for(size, threads))))
+    return size / (LEVEL_SPEEDS[level] * MIB * jobs * speed_factor)
+
+
+def choose_level(size, seconds_available, threads, speed_factor=1.0):
+    """
+    在时间允许的范围内选择最高的压缩级别。
+
+    Returns:
+        int: 压缩级别，预算不足时返回 MIN_LEVEL。
+    """
+    top = SMALL_FILE_MAX_LEVEL if size < SMALL_FILE_SIZE else MAX_LEVEL
+    for level in sorted(LEVEL_SPEEDS, reverse=True):
+        if level <= top and estimate_seconds(size, level, threads, speed_factor) <= seconds_available:
+            return level
+    return MIN_LEVEL
+
+
+def make_compressor(level, size, threads):
+    params = zstandard.ZstdCompressionParameters.from_level(
+        level,
+        source_size=size,
+        threads=threads,
+        job_size=job_size_for(size, threads) if threads > 1 else 0,
+        write_checksum=True,
+        write_content_size=True,
+    )
+    return zstandard.ZstdCompressor(compression_params=params)
+
+
+class _CountingSink:
+    """只统计写入字节数的输出流，用于基准测试"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def compress_file(path, level, threads, output_path=None):
+    """
+    流式压缩单个文件，先写入临时文件再原子替换。
+
+    Returns:
+        dict: 报告条目 (文件名、输入输出大小、压缩比、级别、耗时、吞吐量)。
+    """
+    output_path = output_path or f"{path}.zst"
+    size = os.path.getsize(path)
+    cctx = make_compressor(level, size, threads)
+    tmp_path = f"{output_path}.tmp"
+    start = time.monotonic()
+    with open(path, "rb") as fin, open(tmp_path, "wb") as fout:
+        _, written = cctx.copy_stream(fin, fout, size=size)
+    elapsed = time.monotonic() - start
+    os.replace(tmp_path, output_path)
+    return _report_entry(os.path.basename(path), size, written, level, elapsed)
+
+
+def _report_entry(filename, size, written, level, elapsed):
+    return {
+        "file": filename,
+        "level": level,
+        "input_size": size,
+        "output_size": written,
+        "ratio": round(size / written, 3) if written else None,
+        "seconds": round(elapsed, 3),
+        "throughput_mib_s": round(size / MIB / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def compress_directory(directory, budget, threads, keep_input=False):
+    """
+    在时间预算内压缩目录中的所有 *.pkg.tar。
+
+    按从大到小的顺序处理，每个文件分到的时间与其大小成正比；
+    每压缩完一个文件，用实测吞吐量与估计值之比校正后续的估计。
+    """
+    paths = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pkg.tar")),
+        key=lambda p: (-os.path.getsize(p), p),
+    )
+    remaining_bytes = sum(os.path.getsize(p) for p in paths)
+    deadline = time.monotonic() + budget
+    speed_factor = 1.0
+    entries = []
+    for path in paths:
+        size = os.path.getsize(path)
+        remaining_seconds = max(0.0, deadline - time.monotonic())
+        available = remaining_seconds * size / remaining_bytes if remaining_bytes else remaining_seconds
+        level = choose_level(size, available, threads, speed_factor)
+        print(f"Compressing {os.path.basename(path)} ({size / MIB:.1f} MiB) at level {level}...")
+        entry = compress_file(path, level, threads)
+        entries.append(entry)
+        if not keep_input:
+            os.remove(path)
+
+        remaining_bytes -= size
+        # 只用足够大的文件校正速度，小文件的耗时主要是固定开销
+        if entry["seconds"] > 0.5:
+            measured = estimate_seconds(size, level, threads) / entry["seconds"]
+            speed_factor = 0.5 * speed_factor + 0.5 * measured
+    return entries
+
+
+def benchmark(directory, levels, threads):
+    """用样本目录中的每个文件比较各压缩级别，不写出压缩结果"""
+    entries = []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if not os.path.isfile(path):
+            continue
+        size = os.path.getsize(path)
+        for level in levels:
+            sink = _CountingSink()
+            start = time.monotonic()
+            with open(path, "rb") as fin:
+                make_compressor(level, size, threads).copy_stream(fin, sink, size=size)
+            entry = _report_entry(filename, size, sink.bytes_written, level, time.monotonic() - start)
+            print(
+                f"{filename:<48} level {level:>2}: ratio {entry['ratio']:>7}, "
+                f"{entry['throughput_mib_s']} MiB/s, {entry['seconds']}s"
+            )
+            entries.append(entry)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在时间预算内对构建产物进行 zstd 压缩.")
+    parser.add_argument("directory", nargs="?", default=".", help="包含 *.pkg.tar 的目录 (默认: 当前目录).")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        metavar="SECONDS",
+        help=f"全部文件压缩的总时间预算 (默认: {DEFAULT_BUDGET} 秒).",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="压缩线程数 (默认: CPU 核心数).",
+    )
+    parser.add_argument("--report", metavar="PATH", help="可选: 将每个文件的压缩结果写入 JSON 报告.")
+    parser.add_argument("--keep-input", action="store_true", help="压缩后保留原始的 *.pkg.tar.")
+    parser.add_argument(
+        "--bench",
+        action="store_true",
+        help="基准测试模式: 对目录中的每个文件比较 --levels 中的各级别, 不写出压缩文件.",
+    )
+    parser.add_argument(
+        "--levels",
+        default=DEFAULT_BENCH_LEVELS,
+        help=f"基准测试使用的压缩级别, 逗号分隔 (默认: {DEFAULT_BENCH_LEVELS}).",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Directory '{args.directory}' not found.")
+        sys.exit(1)
+    threads = max(1, args.threads)
+
+    start = time.monotonic()
+    if args.bench:
+        levels = [int(level) for level in args.levels.split(",") if level.strip()]
+        entries = benchmark(args.directory, levels, threads)
+    else:
+        entries = compress_directory(args.directory, args.budget, threads, args.keep_input)
+    elapsed = time.monotonic() - start
+
+    report = {"mode": "bench" if args.bench else "compress", "threads": threads, "elapsed_seconds": round(elapsed, 3)}
+    if not args.bench:
+        total_in = sum(e["input_size"] for e in entries)
+        total_out = sum(e["output_size"] for e in entries)
+        report.update(budget_seconds=args.budget, input_size=total_in, output_size=total_out)
+        print(
+            f"==> Compressed {len(entries)} file(s): {total_in / MIB:.1f} MiB -> {total_out / MIB:.1f} MiB "
+            f"in {elapsed:.1f}s (budget {args.budget:.0f}s)."
+        )
+
+    if args.report:
+        report["files"] = entries
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Report written to '{args.report}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+软件包二进制差分 (delta) 工具。
+
+对新构建的软件包和上一次发布的版本，在解压后的 .pkg.tar 之间用
+`zstd --patch-from` (长窗口模式) 生成差分文件。用户已经缓存了旧版本时，
+只需下载差分即可还原出新版本的 .pkg.tar。
+
+差分只在明显小于完整软件包时才会保留。差分信息记录在 deltas.json 中，
+由 packages.py --deltas 合并进 packages.json。deltas.json 以新软件包的文件名为键，每个条目包含:
+
+    filename / size          差分文件名和大小
+    target_filename          新软件包 (.pkg.tar.zst) 的文件名
+    target_sha256            还原结果的 sha256，即解压后的 .pkg.tar 的哈希，
+                             不是签名并发布的 .pkg.tar.zst 的哈希 (后者见数据库中的 %SHA256SUM%)
+    base_filename / base_sha256 / base_version
+                             旧版本软件包的文件名、该文件 (原样，通常是 .pkg.tar.zst) 的 sha256 和版本
+    window_log               还原时 zstd --long 需要的窗口大小
+
+子命令:
+    create   NEW BASE -o DELTA        生成差分 (NEW/BASE 可以是 .pkg.tar 或 .pkg.tar.zst)
+    apply    BASE DELTA -o OUT        由旧版本和差分还原并校验新版本的 .pkg.tar
+    publish  DIR --published URL      发布流程: 为目录中的每个新软件包生成相对于已发布版本的差分
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import urllib.request
+
+import vercmp
+
+HTTP_TIMEOUT = 60
+DELTA_SUFFIX = ".delta"
+DEFAULT_LEVEL = 19
+# 差分不超过完整软件包 (压缩后) 大小的该比例时才保留
+DEFAULT_MAX_RATIO = 0.5
+# --patch-from 要求窗口覆盖整个旧版本，zstd 支持的最大窗口为 2 GiB
+MIN_WINDOW_LOG = 27
+MAX_WINDOW_LOG = 31
+
+
+class DeltaError(Exception):
+    """差分生成、还原或校验失败"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def window_log_for(*sizes):
+    """能覆盖最大输入的窗口大小 (以 2 为底的对数)"""
+    return max(MIN_WINDOW_LOG, math.ceil(math.log2(max(sizes) + 1)))
+
+
+def _run_zstd(args):
+    result = subprocess.run(["zstd", "-q", "-f", *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise DeltaError(f"zstd {' '.join(args)} failed: {result.stderr.strip()}")
+
+
+def _as_tar(path, tmp_dir):
+    """返回未压缩的 .pkg.tar 路径，必要时解压到临时目录"""
+    if not path.endswith(".zst"):
+        return path
+    output = os.path.join(tmp_dir, os.path.basename(path)[: -len(".zst")])
+    _run_zstd(["-d", path, "-o", output])
+    return output
+
+
+def create_delta(new_path, base_path, output_path, level=DEFAULT_LEVEL, max_ratio=DEFAULT_MAX_RATIO):
+    """
+    生成 new_path 相对于 base_path 的差分。
+
+    Returns:
+        dict | None: 差分信息 (字段见模块说明)；差分不够小 (超过完整软件包大小的 max_ratio) 时删除差分并返回 None。
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        new_tar = _as_tar(new_path, tmp_dir)
+        base_tar = _as_tar(base_path, tmp_dir)
+        new_size, base_size = os.path.getsize(new_tar), os.path.getsize(base_tar)
+        window_log = window_log_for(new_size, base_size)
+        if window_log > MAX_WINDOW_LOG:
+            raise DeltaError(f"'{os.path.basename(new_path)}' is too large for --patch-from")
+
+        ultra = ["--ultra"] if level > 19 else []
+        _run_zstd(
+            [f"-{level}", *ultra, "-T0", f"--long={window_log}", f"--patch-from={base_tar}", new_tar, "-o", output_path]
+        )
+        target_sha256 = file_sha256(new_tar)
+
+    delta_size = os.path.getsize(output_path)
+    full_size = os.path.getsize(new_path)
+    if delta_size > full_size * max_ratio:
+        os.remove(output_path)
+        return None
+    return {
+        "filename": os.path.basename(output_path),
+        "size": delta_size,
+        "target_filename": os.path.basename(new_path),
+        "target_sha256": target_sha256,
+        "base_filename": os.path.basename(base_path),
+        "base_sha256": file_sha256(base_path),
+        "window_log": window_log,
+    }
+
+
+def apply_delta(base_path, delta_path, output_path, window_log=MAX_WINDOW_LOG, expect_sha256=None, base_sha256=None):
+    """
+    由旧版本和差分还原新版本的 .pkg.tar，并校验内容。
+
+    Raises:
+        DeltaError: 旧版本与差分不匹配，或还原结果的 sha256 与期望值不符。
+    """
+    if base_sha256 and file_sha256(base_path) != base_sha256:
+        raise DeltaError(f"'{os.path.basename(base_path)}' is not the base this delta was made from")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base_tar = _as_tar(base_path, tmp_dir)
+        _run_zstd(["-d", f"--long={window_log}", f"--patch-from={base_tar}", delta_path, "-o", output_path])
+    if expect_sha256 and file_sha256(output_path) != expect_sha256:
+        os.remove(output_path)
+        raise DeltaError(f"Reconstructed '{os.path.basename(output_path)}' does not match the expected sha256")
+    return output_path
+
+
+def load_published(source):
+    """读取已发布的 packages.json (本地路径或 URL)，返回 (pkgname, arch) 到最新条目的映射"""
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=HTTP_TIMEOUT) as response:
+            entries = json.load(response)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    groups = vercmp.group_by_package(entries, key=lambda e: (e["name"], e["version"], e.get("arch", "")))
+    return {key: versions[0][1] for key, versions in groups.items()}
+
+
+def _fetch_base(base_source, filename, tmp_dir):
+    """从本地目录或 URL 前缀获取旧版本软件包"""
+    if not base_source.startswith(("http://", "https://")):
+        return os.path.join(base_source, filename)
+    output = os.path.join(tmp_dir, filename)
+    url = f"{base_source.rstrip('/')}/{urllib.request.quote(filename)}"
+    with urllib.request.urlopen(url, timeout=HTTP_TIMEOUT) as response, open(output, "wb") as f:
+        shutil.copyfileobj(response, f)
+    return output
+
+
+def publish_deltas(directory, published_source, base_source, index_path, level, max_ratio):
+    """
+    为目录中每个有已发布旧版本的软件包生成差分，并写出 deltas.json。
+
+    单个软件包失败 (下载失败、旧版本缺失等) 只打印警告，不影响发布。
+    """
+    published = load_published(published_source)
+    index = {}
+    filenames = sorted(f for f in os.listdir(directory) if vercmp.parse_package_filename(f))
+    for filename in filenames:
+        name, version, arch = vercmp.parse_package_filename(filename)
+        base = published.get((name, arch))
+        if base is None or base["filename"] == filename:
+            continue
+        if vercmp.vercmp(version, base["version"]) <= 0:
+            continue
+
+        print(f"Creating delta for '{filename}' from {base['version']}...")
+        output_path = os.path.join(directory, f"{filename}{DELTA_SUFFIX}")
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                base_path = _fetch_base(base_source, base["filename"], tmp_dir)
+                info = create_delta(os.path.join(directory, filename), base_path, output_path, level, max_ratio)
+        except (OSError, DeltaError) as e:
+            print(f"Warning: Could not create delta for '{filename}': {e}")
+            continue
+        if info is None:
+            print("  -> Delta is not meaningfully smaller than the package, skipped.")
+            continue
+        info["base_version"] = base["version"]
+        index[filename] = info
+        print(f"  -> {info['filename']}: {info['size']} bytes")
+
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    print(f"==> Wrote {len(index)} delta(s) to '{index_path}'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成和还原软件包的二进制差分 (zstd --patch-from).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create = subparsers.add_parser("create", help="生成 NEW 相对于 BASE 的差分.")
+    create.add_argument("new", help="新版本软件包 (.pkg.tar 或 .pkg.tar.zst).")
+    create.add_argument("base", help="旧版本软件包 (.pkg.tar 或 .pkg.tar.zst).")
+    create.add_argument("-o", "--output", help=f"差分输出路径 (默认: NEW{DELTA_SUFFIX}).")
+
+    apply = subparsers.add_parser("apply", help="由 BASE 和差分还原新版本的 .pkg.tar 并校验.")
+    apply.add_argument("base", help="旧版本软件包 (.pkg.tar 或 .pkg.tar.zst).")
+    apply.add_argument("delta", help="差分文件.")
+    apply.add_argument("-o", "--output", required=True, help="还原出的 .pkg.tar 路径.")
+    apply.add_argument("--index", help="可选: deltas.json, 从中读取期望的 sha256 和窗口大小.")
+    apply.add_argument("--sha256", help="可选: 还原结果期望的 sha256.")
+
+    publish = subparsers.add_parser("publish", help="为目录中的新软件包生成相对于已发布版本的差分.")
+    publish.add_argument("directory", help="新软件包所在目录, 差分也写入该目录.")
+    publish.add_argument("--published", required=True, help="已发布的 packages.json (本地路径或 URL).")
+    publish.add_argument("--base-url", required=True, help="已发布软件包所在的目录或 URL 前缀.")
+    publish.add_argument("--index", help="deltas.json 输出路径 (默认: DIR/deltas.json).")
+
+    for subparser in (create, publish):
+        subparser.add_argument("--level", type=int, default=DEFAULT_LEVEL, help=f"压缩级别 (默认: {DEFAULT_LEVEL}).")
+        subparser.add_argument(
+            "--max-ratio",
+            type=float,
+            default=DEFAULT_MAX_RATIO,
+            help=f"差分大小超过完整软件包的该比例时丢弃 (默认: {DEFAULT_MAX_RATIO}).",
+        )
+    args = parser.parse_args()
+
+    try:
+        if args.command == "create":
+            output = args.output or f"{args.new}{DELTA_SUFFIX}"
+            info = create_delta(args.new, args.base, output, args.level, args.max_ratio)
+            if info is None:
+                print("Delta is not meaningfully smaller than the package, skipped.")
+            else:
+                print(json.dumps(info, indent=2, ensure_ascii=False))
+        elif args.command == "apply":
+            info = {}
+            if args.index:
+                with open(args.index, "r", encoding="utf-8") as f:
+                    delta_name = os.path.basename(args.delta)
+                    info = next((d for d in json.load(f).values() if d["filename"] == delta_name), {})
+            apply_delta(
+                args.base,
+                args.delta,
+                args.output,
+                info.get("window_log", MAX_WINDOW_LOG),
+                args.sha256 or info.get("target_sha256"),
+                info.get("base_sha256"),
+            )
+            print(f"Reconstructed '{args.output}'.")
+        else:
+            index_path = args.index or os.path.join(args.directory, "deltas.json")
+            publish_deltas(args.directory, args.published, args.base_url, index_path, args.level, args.max_ratio)
+    except DeltaError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
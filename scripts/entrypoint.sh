@@ -14,7 +14,7 @@ cat ./configs/pacman.conf >> /etc/pacman.conf
 
 # 安装基础依赖
 # 注意：先刷新 keys 和系统，确保环境是最新的
-pacman -Syu --noconfirm --overwrite '*' base-devel git pacman-contrib mold python-pyyaml sudo tree
+pacman -Syu --noconfirm --overwrite '*' base-devel git pacman-contrib mold python-pyyaml python-zstandard sudo tree
 
 # patch makepkg 允许 root 运行 (虽然我们在下面会创建 builder 用户，但这一步通常是为了兼容性或特殊操作)
 sed -i '/E_ROOT/d' /usr/bin/makepkg
@@ -82,9 +82,9 @@ rm -rf /var/cache/makepkg/pkg
 # ==============================
 # 5. 构建目标包
 # ==============================
-# $1 是从命令行传入的第一个参数 (即 package name)
+# 命令行参数为要构建的包名，合并构建分片时可以有多个
 echo "================================================="
-PACKAGE_NAME="$1"
+PACKAGE_NAMES=("$@")
 
 # 安装额外依赖 (Added Feature)
 echo ">> [5/7] Checking for extra dependencies..."
@@ -96,15 +96,20 @@ else
     echo ">> No extra dependencies found."
 fi
 
-echo ">> [6/7] Building package: ${PACKAGE_NAME}..."
+echo ">> [6/7] Building package(s): ${PACKAGE_NAMES[*]}..."
 # 调用 build-one.sh
 # 确保传递 HOME 变量，否则 yay/makepkg 可能会找不到用户目录
+# 构建分片中部分包失败时，仍然压缩其余已构建的包，最后再以失败状态退出
+BUILD_STATUS=0
 if [ -f "scripts/build-one.sh" ]; then
-    sudo -E -u builder HOME=/home/builder bash scripts/build-one.sh "${PACKAGE_NAME}"
+    sudo -E -u builder HOME=/home/builder bash scripts/build-one.sh "${PACKAGE_NAMES[@]}" || BUILD_STATUS=$?
 else
     echo "!! Error: scripts/build-one.sh not found!"
     exit 1
 fi
+if [ "$BUILD_STATUS" -ne 0 ] && [ "${#PACKAGE_NAMES[@]}" -eq 1 ]; then
+    exit "$BUILD_STATUS"
+fi
 
 # ==============================
 # 6. 后处理
@@ -113,14 +118,13 @@ fi
 find . -maxdepth 1 -type f -name '*:*' | while IFS= read -r file; do mv "$file" "${file//:/_}"; done
 
 echo "================================================="
-echo ">> [7/7] Compressing published packages with zstd (high ratio)..."
-shopt -s nullglob
-for pkg in *.pkg.tar; do
-    echo "Compressing $pkg..."
-    zstd -c -T0 --ultra -22 --rsyncable "$pkg" > "${pkg}.zst"
-    rm "$pkg"
-done
-shopt -u nullglob
+echo ">> [7/7] Compressing published packages with zstd..."
+# 按文件大小和时间预算选择压缩级别, 每个文件的压缩结果写入 compress-report.json
+python scripts/compress.py . --budget "${INPUT_COMPRESS_BUDGET:-1800}" --report compress-report.json
 
 echo "================================================="
+if [ "$BUILD_STATUS" -ne 0 ]; then
+    echo ">> Entrypoint finished, but some packages failed to build."
+    exit "$BUILD_STATUS"
+fi
 echo ">> Entrypoint finished successfully."
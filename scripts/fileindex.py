@@ -0,0 +1,165 @@
+"""
+软件包文件列表的解析，以及 路径 -> 软件包 的归属索引。
+
+文件列表优先从软件包开头的 .MTREE 中读取 (无需解压整个软件包)，
+缺少 .MTREE 时由调用方退回到 tar 成员名。
+
+索引格式 (紧凑 JSON):
+    {
+      "packages": [包名, ...],                    按名称排序
+      "prefixes": [目录前缀, ...],                按字节序排序，所有路径共享
+      "prefix":   [前缀下标, ...],                \\
+      "name":     [文件名, ...],                   > 三个并列数组，按完整路径排序，可二分查找
+      "owners":   [包下标 或 [包下标, ...], ...]  /
+    }
+目录不计入索引，它们通常由多个软件包共同拥有。
+
+也可以直接查询索引:
+    python scripts/fileindex.py pkgindex/files.json /usr/bin/foo
+"""
+
+import bisect
+import gzip
+import json
+import re
+import sys
+
+OCTAL_ESCAPE_RE = re.compile(rb"\\([0-7]{3})")
+
+
+def _unescape(path):
+    # mtree 中非打印字符和空格以 \ooo 八进制转义
+    return OCTAL_ESCAPE_RE.sub(lambda m: bytes([int(m.group(1), 8)]), path).decode("utf-8", "surrogateescape")
+
+
+def parse_mtree(data):
+    """
+    解析 makepkg 生成的 .MTREE (gzip 压缩的 mtree 文本)。
+
+    Raises:
+        ValueError: 内容不是 mtree 格式。
+
+    Returns:
+        list[str]: 与 tar 成员名形式相同的文件列表：不含 "./" 前缀和以 "." 开头的元数据，
+            目录以 "/" 结尾，按字节序排序。
+    """
+    text = gzip.decompress(data)
+    if not text.startswith(b"#mtree"):
+        raise ValueError("not an mtree file")
+    files = []
+    defaults = {}
+    pending = b""
+    for raw_line in text.splitlines():
+        line = pending + raw_line
+        # 以反斜杠结尾的行与下一行相连
+        if line.endswith(b"\\") and not line.endswith(b"\\\\"):
+            pending = line[:-1]
+            continue
+        pending = b""
+        if not line or line.startswith(b"#"):
+            continue
+        words = line.split()
+        if words[0] == b"/set":
+            defaults.update(word.split(b"=", 1) for word in words[1:] if b"=" in word)
+            continue
+        if words[0] == b"/unset":
+            for word in words[1:]:
+                defaults.pop(word, None)
+            continue
+
+        path = _unescape(words[0])
+        if path.startswith("./"):
+            path = path[2:]
+        if not path or path == "." or path.startswith("."):
+            continue
+        keywords = dict(defaults)
+        keywords.update(word.split(b"=", 1) for word in words[1:] if b"=" in word)
+        files.append(path + "/" if keywords.get(b"type") == b"dir" else path)
+    files.sort(key=lambda name: name.encode("utf-8", "surrogateescape"))
+    return files
+
+
+def build_file_index(file_lists):
+    """
+    由 {包名: 文件列表} 构建归属索引 (格式见模块说明)。
+    """
+    packages = sorted(file_lists)
+    owners_by_path = {}
+    for i, name in enumerate(packages):
+        for path in file_lists[name]:
+            if path.endswith("/"):
+                continue
+            owners_by_path.setdefault(path, []).append(i)
+
+    paths = sorted(owners_by_path, key=lambda p: p.encode("utf-8", "surrogateescape"))
+    prefixes = sorted(
+        {p.rpartition("/")[0] + "/" if "/" in p else "" for p in paths},
+        key=lambda p: p.encode("utf-8", "surrogateescape"),
+    )
+    prefix_ids = {prefix: i for i, prefix in enumerate(prefixes)}
+
+    index = {"packages": packages, "prefixes": prefixes, "prefix": [], "name": [], "owners": []}
+    for path in paths:
+        directory, _, name = path.rpartition("/")
+        owners = owners_by_path[path]
+        index["prefix"].append(prefix_ids[directory + "/" if directory else ""])
+        index["name"].append(name)
+        index["owners"].append(owners[0] if len(owners) == 1 else owners)
+    return index
+
+
+def find_conflicts(file_lists):
+    """
+    找出被多个软件包同时拥有的文件 (不含目录)。
+
+    Returns:
+        dict: 路径到包名列表的映射，按路径排序。
+    """
+    owners = {}
+    for name in sorted(file_lists):
+        for path in file_lists[name]:
+            if not path.endswith("/"):
+                owners.setdefault(path, []).append(name)
+    return {path: names for path, names in sorted(owners.items()) if len(names) > 1}
+
+
+def lookup(index, path):
+    """在索引中二分查找路径的所属软件包，返回包名列表"""
+    path = path.lstrip("/")
+    full_paths = _FullPaths(index)
+    i = bisect.bisect_left(full_paths, path.encode("utf-8", "surrogateescape"))
+    if i == len(full_paths) or full_paths[i] != path.encode("utf-8", "surrogateescape"):
+        return []
+    owners = index["owners"][i]
+    return [index["packages"][o] for o in (owners if isinstance(owners, list) else [owners])]
+
+
+class _FullPaths:
+    """按需拼接完整路径的只读序列，供 bisect 使用而不必展开整个索引"""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return len(self._index["name"])
+
+    def __getitem__(self, i):
+        prefix = self._index["prefixes"][self._index["prefix"][i]]
+        return (prefix + self._index["name"][i]).encode("utf-8", "surrogateescape")
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("usage: fileindex.py <index.json> <path>", file=sys.stderr)
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        index = json.load(f)
+    owners = lookup(index, sys.argv[2])
+    if not owners:
+        print(f"No package owns '{sys.argv[2]}'.")
+        sys.exit(1)
+    print("\n".join(owners))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,425 @@
 import argparse
+import heapq
 import json
+import os
+import re
+import subprocess
 import sys
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
 import yaml
 
+import manifest
+import repodb
+
+# --- 构建计划 (跳过未变化的包) 配置 ---
+# 接口地址可以通过环境变量覆盖 (例如 benchmark.py 启动的本地桩服务)
+AUR_API_URL = os.environ.get("OUR_AUR_RPC_URL", "https://aur.archlinux.org/rpc.php")
+AUR_SRCINFO_URL = os.environ.get("OUR_AUR_SRCINFO_URL", "https://aur.archlinux.org/cgit/aur.git/plain/.SRCINFO?h={}")
+# AUR RPC 允许的最大 URI 长度
+AUR_MAX_URI_LENGTH = 4443
+HTTP_TIMEOUT = 30
+# 版本号来自上游仓库最新提交的 VCS 包
+VCS_SUFFIXES = ("-git", "-svn", "-hg", "-bzr")
+# VCS 包版本号中常见的提交哈希，如 r123.abcdef0 或 1.2.r3.gabcdef0 (git describe 风格的 g 前缀)
+COMMIT_HASH_RE = re.compile(r"(?:(?<=[.\-_+:])|^)(g?)([0-9a-f]{7,40})(?=$|[.\-_+:])")
+
+
+def make_item(node: dict, aur_dependencies: bool = True) -> dict:
+    """
+    将 packages.yaml 中的一个节点转换为构建矩阵条目.
+
+    aur_dependencies 为 False 时 dependencies 只包含手写的包名字符串，
+    不包含 {"name": ...} 形式的 AUR 子依赖 (按拓扑波次构建时它们已在更早的波次中构建).
+    """
+    deps = node.get("dependencies", [])
+    if not isinstance(deps, list):
+        deps = [deps]
+    # 依赖既可以是手写的包名字符串，也可以是 add-package.py 生成的 {"name": ...} 节点
+    deps_str = " ".join(
+        d["name"] if isinstance(d, dict) else str(d)
+        for d in deps
+        if aur_dependencies or not isinstance(d, dict)
+    )
+
+    excludes = node.get("exclude", [])
+    if not isinstance(excludes, list):
+        excludes = [excludes]
+    excludes_str = " ".join(excludes)
+
+    base = node.get("base", "")
+
+    env_vars = node.get("env", [])
+    if not isinstance(env_vars, list):
+        env_vars = [env_vars] if env_vars else []
+    env_str = "\n".join(str(e) for e in env_vars)
+
+    return {
+        "name": node["name"],
+        "dependencies": deps_str,
+        "exclude": excludes_str,
+        "base": base,
+        "env": env_str
+    }
+
 
-def find_packages(nodes: list, lto_filter: bool, recursive: bool = False):
+def matches_lto(node: dict, lto_filter: bool) -> bool:
+    """检查节点的 'lto' 字段是否与筛选条件匹配，无 lto 时默认为启用 lto"""
+    return (node.get("lto") is not False) == lto_filter
+
+
+def find_packages(nodes: list, lto_filter: bool, recursive: bool = False, visited: set[int] | None = None):
     """
     一个递归生成器，用于深度优先遍历依赖森林。
 
     Args:
         nodes (list): 当前层的软件包节点列表。
         lto_filter (bool): 要筛选的 lto 标志 (True 或 False)。
+        visited (set): 已遍历过的节点对象的 id。紧凑清单展开后共享的节点是同一个对象，
+            只输出和展开一次，开销与不同软件包的数量成线性关系。
 
     Yields:
-        str: 匹配筛选条件的软件包名称。
+        dict: 匹配筛选条件的软件包构建条目。
     """
+    if visited is None:
+        visited = set()
     # 遍历当前层的所有节点 (包)
     for node in nodes:
-        # 检查当前节点的 'lto' 字段是否与筛选条件匹配
-        # 使用 .get() 可以安全地处理节点没有 'lto' 字段的情况
-        # 无 lto 时默认为启用 lto
-        deps = node.get("dependencies", [])
-        if not isinstance(deps, list):
-            deps = [deps]
-        deps_str = " ".join(deps)
-
-        excludes = node.get("exclude", [])
-        if not isinstance(excludes, list):
-            excludes = [excludes]
-        excludes_str = " ".join(excludes)
-
-        base = node.get("base", "")
-
-        env_vars = node.get("env", [])
-        if not isinstance(env_vars, list):
-            env_vars = [env_vars] if env_vars else []
-        env_str = "\n".join(str(e) for e in env_vars)
-
-        item = {
-            "name": node["name"],
-            "dependencies": deps_str,
-            "exclude": excludes_str,
-            "base": base,
-            "env": env_str
-        }
-
-        if lto_filter and node.get("lto") is not False:
-                yield item
-        elif not lto_filter and node.get("lto") is False:
-                yield item
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if matches_lto(node, lto_filter):
+            yield make_item(node)
 
         # 如果存在 'dependencies' 键，则递归进入下一层
         if recursive and "dependencies" in node and node["dependencies"]:
             # 'yield from' 是一个优雅的语法，用于链接生成器
-            yield from find_packages(node["dependencies"], lto_filter, recursive)
+            children = [d for d in node["dependencies"] if isinstance(d, dict)]
+            yield from find_packages(children, lto_filter, recursive, visited)
+
+
+def build_dependency_dag(forest: list) -> tuple[dict[str, dict], dict[str, set[str]]]:
+    """
+    将嵌套的依赖森林合并为去重的有向无环图.
+
+    同名节点只保留一个定义 (优先使用带有手工配置的那个)；字符串形式的依赖只是构建时安装的额外依赖，不作为图中的节点.
+    每个节点对象只展开一次: 紧凑清单展开后共享的节点是同一个对象，因此开销与不同软件包的数量成线性关系，
+    而不是与依赖树中的路径数成正比.
+
+    Returns:
+        tuple: (包名 -> 节点, 包名 -> 其直接依赖的包名集合)
+    """
+    nodes: dict[str, dict] = {}
+    edges: dict[str, set[str]] = {}
+    merged: set[int] = set()
+    stack = list(reversed(forest))
+    while stack:
+        node = stack.pop()
+        if id(node) in merged:
+            continue
+        merged.add(id(node))
+        name = node["name"]
+        children = [d for d in node.get("dependencies") or [] if isinstance(d, dict)]
+        config = {k: v for k, v in node.items() if k not in ("name", "dependencies")}
+        if name not in nodes:
+            nodes[name] = node
+        elif config:
+            existing = {k: v for k, v in nodes[name].items() if k not in ("name", "dependencies")}
+            if not existing:
+                # 带有手工配置 (lto, env 等) 的定义优先于不带配置的引用
+                nodes[name] = node
+            elif existing != config:
+                print(f"警告: 软件包 '{name}' 在清单中有多个不同的配置，使用第一次出现的配置。", file=sys.stderr)
+        edges.setdefault(name, set()).update(child["name"] for child in children)
+        stack.extend(reversed(children))
+    return nodes, edges
+
+
+def _find_cycle(remaining: set[str], edges: dict[str, set[str]]) -> list[str]:
+    """在剩余的节点中找出一个依赖环，用于错误提示"""
+    start = min(remaining)
+    path = [start]
+    seen = {start: 0}
+    while True:
+        next_name = min(d for d in edges[path[-1]] if d in remaining)
+        if next_name in seen:
+            return path[seen[next_name]:] + [next_name]
+        seen[next_name] = len(path)
+        path.append(next_name)
+
+
+def topological_waves(edges: dict[str, set[str]]) -> list[list[str]]:
+    """
+    将依赖图划分为拓扑 "波次": 每个波次中的包，其依赖都在更早的波次中.
+
+    Raises:
+        ValueError: 依赖图中存在环.
+    """
+    pending = {name: set(deps) for name, deps in edges.items()}
+    waves = []
+    while pending:
+        wave = sorted(name for name, deps in pending.items() if not deps)
+        if not wave:
+            cycle = _find_cycle(set(pending), edges)
+            raise ValueError("依赖关系中存在环: " + " -> ".join(cycle))
+        waves.append(wave)
+        for name in wave:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(wave)
+    return waves
+
+
+def load_published_versions(source: str) -> dict[str, str]:
+    """
+    读取已发布的软件包版本，返回 包名/pkgbase -> 版本 的映射.
+
+    source 可以是 packages.json (本地路径或 URL)，也可以是仓库数据库 (*.db / *.db.tar.gz).
+    """
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=HTTP_TIMEOUT) as response:
+            entries = json.load(response)
+    elif source.endswith(".json"):
+        with open(source, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        entries = [
+            {
+                "name": fields["NAME"][0],
+                "version": fields["VERSION"][0],
+                "pkgbase": (fields.get("BASE") or fields["NAME"])[0],
+            }
+            for fields in (entry.get("desc", {}) for entry in repodb.iter_db_entries(source))
+            if fields.get("NAME") and fields.get("VERSION")
+        ]
+
+    versions: dict[str, str] = {}
+    for entry in entries:
+        # 拆分包以 pkgbase 作为根包名，包名本身优先
+        if entry.get("pkgbase"):
+            versions.setdefault(entry["pkgbase"], entry["version"])
+    for entry in entries:
+        versions[entry["name"]] = entry["version"]
+    return versions
+
+
+def fetch_aur_info(package_names: list[str]) -> dict[str, dict]:
+    """批量查询 AUR 包信息，按 URI 长度限制切分请求"""
+    results: dict[str, dict] = {}
+    names = sorted(set(package_names))
+    while names:
+        query = [("v", "5"), ("type", "info")]
+        while names:
+            candidate = query + [("arg[]", names[0])]
+            if len(query) > 2 and len(AUR_API_URL) + 1 + len(urllib.parse.urlencode(candidate)) > AUR_MAX_URI_LENGTH:
+                break
+            query = candidate
+            names.pop(0)
+        url = f"{AUR_API_URL}?{urllib.parse.urlencode(query)}"
+        with urllib.request.urlopen(url, timeout=HTTP_TIMEOUT) as response:
+            data = json.load(response)
+        results.update({pkg["Name"]: pkg for pkg in data.get("results", [])})
+    return results
+
+
+def fetch_vcs_head(pkgbase: str) -> str | None:
+    """从 AUR 的 .SRCINFO 中找到 VCS 源，并用 git ls-remote 获取上游最新提交"""
+    try:
+        with urllib.request.urlopen(AUR_SRCINFO_URL.format(pkgbase), timeout=HTTP_TIMEOUT) as response:
+            srcinfo = response.read().decode("utf-8")
+    except OSError:
+        return None
+
+    for line in srcinfo.splitlines():
+        key, _, value = line.strip().partition(" = ")
+        if key != "source" or "git+" not in value:
+            continue
+        # 形如 name::git+https://host/repo.git#branch=main
+        url = value.split("::", 1)[-1].removeprefix("git+")
+        url, _, fragment = url.partition("#")
+        ref = "HEAD"
+        kind, _, ref_name = fragment.partition("=")
+        if kind in ("branch", "tag") and ref_name:
+            ref = ref_name
+        elif kind == "commit" and ref_name:
+            return ref_name
+        try:
+            output = subprocess.run(
+                ["git", "ls-remote", url, ref],
+                capture_output=True,
+                text=True,
+                timeout=HTTP_TIMEOUT,
+                check=True,
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            return None
+        return output.split()[0] if output.strip() else None
+    return None
+
+
+def published_commit(version: str) -> str | None:
+    """
+    从 VCS 包的版本号中取出上游提交哈希.
+
+    日期 (20240101) 或纯数字的版本段也可能是 7 位以上的十六进制串，因此优先使用带 g 前缀的段，
+    否则只考虑含有 a-f 字母的段；有多个候选时取最后一个 (哈希总在 pkgver 末尾).
+    """
+    matches = COMMIT_HASH_RE.findall(version)
+    candidates = [digits for prefix, digits in matches if prefix] or [
+        digits for _, digits in matches if not digits.isdigit()
+    ]
+    return candidates[-1] if candidates else None
+
+
+def plan_package(item: dict, aur_info: dict, published: dict, vcs_heads: dict) -> dict:
+    """
+    判断一个根包是否需要重新构建.
+
+    Returns:
+        dict: {"name", "build", "reason", "aur_version", "published_version"}，
+        reason 取值为 new / outdated / up-to-date / not-in-aur / vcs-updated / vcs-unchanged / vcs-unknown.
+    """
+    name = item["name"]
+    lookup_name = item.get("base") or name
+    info = aur_info.get(lookup_name)
+    published_version = published.get(name)
+    plan = {
+        "name": name,
+        "build": True,
+        "reason": "new",
+        "aur_version": info.get("Version") if info else None,
+        "published_version": published_version,
+    }
+
+    if info is None:
+        # 可能是 ourpkg/ 下的本地包，无法判断是否变化，总是构建
+        plan["reason"] = "not-in-aur"
+    elif published_version is None:
+        plan["reason"] = "new"
+    elif lookup_name.endswith(VCS_SUFFIXES):
+        # VCS 包在 AUR 上的版本号通常是过时的，需要对比上游最新提交
+        head = vcs_heads.get(info.get("PackageBase", lookup_name))
+        commit = published_commit(published_version)
+        if not head or not commit:
+            plan["reason"] = "vcs-unknown"
+        elif head.startswith(commit):
+            plan["build"], plan["reason"] = False, "vcs-unchanged"
+        else:
+            plan["reason"] = "vcs-updated"
+    elif info["Version"] != published_version:
+        plan["reason"] = "outdated"
+    else:
+        plan["build"], plan["reason"] = False, "up-to-date"
+    return plan
+
+
+def plan_builds(items: list[dict], published_source: str, aur_fixture: str | None = None) -> list[dict]:
+    """为一组根包生成构建计划，aur_fixture 用于在本地测试时代替 AUR 网络查询"""
+    published = load_published_versions(published_source)
+    lookup_names = [item.get("base") or item["name"] for item in items]
+
+    if aur_fixture:
+        with open(aur_fixture, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        aur_info = {pkg["Name"]: pkg for pkg in fixture.get("results", [])}
+        vcs_heads = fixture.get("vcs_heads", {})
+    else:
+        aur_info = fetch_aur_info(lookup_names)
+        # 只有已发布过的 VCS 包才需要查询上游最新提交
+        vcs_bases = sorted(
+            {
+                aur_info[lookup].get("PackageBase", lookup)
+                for item, lookup in zip(items, lookup_names)
+                if lookup in aur_info and lookup.endswith(VCS_SUFFIXES) and item["name"] in published
+            }
+        )
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            vcs_heads = dict(zip(vcs_bases, executor.map(fetch_vcs_head, vcs_bases)))
+
+    return [plan_package(item, aur_info, published, vcs_heads) for item in items]
+
+
+def load_history(path: str) -> dict[str, float]:
+    """
+    读取构建耗时历史，返回 包名 -> 预计耗时 (秒).
+
+    文件格式为 {"包名": 秒数} 或 {"包名": [历次秒数, ...]}，后者取平均值.
+    该文件需要手工维护，build-one.sh 会在构建日志中输出每个包的耗时.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    history = {}
+    for name, value in data.items():
+        samples = value if isinstance(value, list) else [value]
+        samples = [float(s) for s in samples if isinstance(s, (int, float))]
+        if samples:
+            history[name] = sum(samples) / len(samples)
+    return history
+
+
+def _is_groupable(item: dict) -> bool:
+    """
+    base、env、exclude 都作用于整个构建容器，带有这些配置的包必须单独构建.
+    额外依赖 (dependencies) 会在构建前统一安装，可以合并.
+    """
+    return not (item["base"] or item["env"] or item["exclude"])
+
+
+def shard_packages(
+    items: list[dict],
+    history: dict[str, float],
+    shards: int,
+    default_duration: float,
+    setup_overhead: float,
+) -> tuple[list[dict], float]:
+    """
+    使用最长处理时间优先 (LPT) 算法将软件包分配到若干个构建分片.
+
+    不可合并的包各占一个分片，其余的包按预计耗时从大到小依次放入当前负载最小的分片.
+    每个分片额外计入一次容器准备开销.
+
+    Returns:
+        tuple: (分片列表, 预计总耗时 makespan)
+    """
+    duration = lambda item: history.get(item["name"], default_duration)  # noqa: E731
+    isolated = [item for item in items if not _is_groupable(item)]
+    groupable = sorted(
+        (item for item in items if _is_groupable(item)), key=duration, reverse=True
+    )
+
+    bins: list[list[dict]] = [[item] for item in isolated]
+    group_bins = min(len(groupable), max(1, shards - len(isolated)))
+    # 堆中元素为 (当前负载, 分片序号)，负载相同时序号小的优先，保证结果稳定
+    heap = [(setup_overhead, len(bins) + i) for i in range(group_bins)]
+    bins.extend([] for _ in range(group_bins))
+    for item in groupable:
+        load, index = heapq.heappop(heap)
+        bins[index].append(item)
+        heapq.heappush(heap, (load + duration(item), index))
+
+    result = []
+    for members in bins:
+        predicted = setup_overhead + sum(duration(item) for item in members)
+        deps = []
+        for item in members:
+            deps.extend(d for d in item["dependencies"].split() if d not in deps)
+        result.append(
+            {
+                # build-one.sh 会依次构建以空格分隔的多个包
+                "name": " ".join(item["name"] for item in members),
+                "dependencies": " ".join(deps),
+                "exclude": members[0]["exclude"] if len(members) == 1 else "",
+                "base": members[0]["base"] if len(members) == 1 else "",
+                "env": members[0]["env"] if len(members) == 1 else "",
+                "packages": [item["name"] for item in members],
+                "predicted_seconds": round(predicted),
+            }
+        )
+    result.sort(key=lambda shard: shard["predicted_seconds"], reverse=True)
+    makespan = max((shard["predicted_seconds"] for shard in result), default=0)
+    return result, makespan
 
 
 def main():
@@ -79,7 +445,60 @@ def main():
         "--no-lto", action="store_true", help="输出所有 lto: false 的软件包"
     )
 
+    parser.add_argument(
+        "--published",
+        metavar="SOURCE",
+        help="可选: 已发布的 packages.json (路径或 URL) 或仓库数据库. 指定后只输出需要重新构建的包.",
+    )
+    parser.add_argument(
+        "--plan-report",
+        metavar="PATH",
+        help="与 --published 一起使用: 将每个包是否构建及其原因写入该 JSON 文件.",
+    )
+    parser.add_argument(
+        "--aur-fixture",
+        metavar="PATH",
+        help="与 --published 一起使用: 从本地 JSON 文件读取 AUR 信息 (格式同 RPC 响应，"
+        "可附加 vcs_heads 字段)，用于离线测试.",
+    )
+
+    parser.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help="可选: 根据构建耗时历史将软件包合并为约 N 个构建分片 (每个分片一个 runner).",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="PATH",
+        help="与 --shards 一起使用: 构建耗时历史文件 (JSON, 包名 -> 秒数). "
+        "仓库中没有自动生成该文件的步骤, 需要手工整理, 例如根据构建日志中 "
+        "build-one.sh 输出的 \"Build time for '<包名>': <秒数>s\" 行.",
+    )
+    parser.add_argument(
+        "--default-duration",
+        type=float,
+        default=600,
+        help="与 --shards 一起使用: 历史中没有记录的包的预计耗时, 单位秒 (默认: 600).",
+    )
+    parser.add_argument(
+        "--setup-overhead",
+        type=float,
+        default=300,
+        help="与 --shards 一起使用: 每个分片的容器准备耗时, 单位秒 (默认: 300).",
+    )
+
+    parser.add_argument(
+        "--waves",
+        action="store_true",
+        help="将整个依赖森林去重为有向无环图，按拓扑波次输出 JSON 列表的列表. "
+        "每个波次中的包只依赖更早的波次，可作为并行矩阵依次构建. "
+        "条目的 dependencies 只包含手写的额外依赖, AUR 子依赖由更早的波次构建, 不会在每个父包中重复构建.",
+    )
+
     args = parser.parse_args()
+    if args.waves and args.shards:
+        parser.error("--waves 不能与 --shards 同时使用")
 
     # 2. 根据参数确定筛选条件
     lto_filter_value = True if args.lto else False
@@ -103,9 +522,65 @@ def main():
         sys.exit(1)
 
     # 4. 执行遍历和筛选
-    package_forest = data["packages"]
-    # 将生成器结果转换为列表
-    matching_packages = list(find_packages(package_forest, lto_filter_value))
+    # 紧凑形式的清单 (带有 nodes 表) 会先展开为嵌套的依赖森林
+    package_forest = manifest.load_forest(data)
+    if args.waves:
+        nodes, edges = build_dependency_dag(package_forest)
+        try:
+            wave_names = topological_waves(edges)
+        except ValueError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            sys.exit(1)
+        waves = [
+            [
+                make_item(nodes[name], aur_dependencies=False)
+                for name in wave
+                if matches_lto(nodes[name], lto_filter_value)
+            ]
+            for wave in wave_names
+        ]
+        # 各波次展开后统一经过下面的构建计划筛选，再按原波次重新分组
+        matching_packages = [item for wave in waves for item in wave]
+    else:
+        # 将生成器结果转换为列表
+        matching_packages = list(find_packages(package_forest, lto_filter_value, args.recursive))
+
+    # 根据已发布版本跳过未变化的包
+    if args.published:
+        try:
+            plans = plan_builds(matching_packages, args.published, args.aur_fixture)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"错误: 无法生成构建计划: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.plan_report:
+            with open(args.plan_report, "w", encoding="utf-8") as f:
+                json.dump(plans, f, indent=2, ensure_ascii=False)
+        for plan in plans:
+            print(f"{plan['name']}: {plan['reason']}", file=sys.stderr)
+        matching_packages = [
+            item for item, plan in zip(matching_packages, plans) if plan["build"]
+        ]
+
+    # 按预计耗时合并为构建分片
+    if args.shards:
+        history = {}
+        if args.history:
+            try:
+                history = load_history(args.history)
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"警告: 无法读取构建耗时历史 '{args.history}': {e}", file=sys.stderr)
+        matching_packages, makespan = shard_packages(
+            matching_packages, history, args.shards, args.default_duration, args.setup_overhead
+        )
+        print(
+            f"{len(matching_packages)} 个分片, 预计最长耗时 (makespan): {makespan / 60:.1f} 分钟",
+            file=sys.stderr,
+        )
+
+    if args.waves:
+        selected = {item["name"] for item in matching_packages}
+        waves = [[item for item in wave if item["name"] in selected] for wave in waves]
+        matching_packages = [wave for wave in waves if wave]
 
     # 5. 以单行 JSON 列表格式输出结果
     print(json.dumps(matching_packages))
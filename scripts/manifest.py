@@ -0,0 +1,122 @@
+"""
+packages.yaml 清单的读写工具。
+
+清单有两种等价的形式:
+
+- 嵌套形式 (默认): 每个根包的 `dependencies` 中直接嵌套 AUR 依赖节点，
+  共享的子树在每个出现的位置都会完整展开。
+- 紧凑形式: 根包和依赖节点之间通过 `requires` 中的包名引用，所有非根节点
+  只在顶层的 `nodes` 表中定义一次，文件大小与不同软件包的数量成线性关系。
+
+两种形式中，`dependencies` 里的字符串都表示构建时额外安装的依赖，
+lto、exclude、env、base 等其余键都是节点的手工配置。
+"""
+
+# 由依赖树结构决定的键，其余键均为手工配置
+STRUCTURE_KEYS = ("name", "dependencies", "requires")
+
+
+def is_compact(data) -> bool:
+    """判断解析后的清单是否为紧凑形式"""
+    return isinstance(data, dict) and "nodes" in data
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def expand(data: dict) -> list[dict]:
+    """
+    将紧凑形式的清单展开为嵌套的依赖森林.
+
+    同名节点展开为同一个字典对象，因此展开的开销与不同软件包的数量成线性关系.
+    """
+    roots = _as_list(data.get("packages"))
+    table = {node["name"]: node for node in _as_list(data.get("nodes"))}
+    # 根包也可以被其他包依赖
+    for root in roots:
+        table.setdefault(root["name"], root)
+
+    expanded: dict[str, dict] = {}
+
+    def get(name: str) -> dict:
+        if name not in expanded:
+            source = table.get(name, {"name": name})
+            node = {"name": name}
+            expanded[name] = node
+            strings = [d for d in _as_list(source.get("dependencies")) if isinstance(d, str)]
+            children = [get(child) for child in _as_list(source.get("requires"))]
+            if strings or children:
+                node["dependencies"] = strings + children
+            node.update((k, v) for k, v in source.items() if k not in STRUCTURE_KEYS)
+        return expanded[name]
+
+    return [get(root["name"]) for root in roots]
+
+
+def load_forest(data) -> list[dict]:
+    """返回清单中的依赖森林 (根包列表)，紧凑形式会先被展开"""
+    if is_compact(data):
+        return expand(data)
+    return data["packages"]
+
+
+def _config(node: dict) -> dict:
+    """节点的手工配置，包括字符串形式的额外依赖"""
+    config = {k: v for k, v in node.items() if k not in STRUCTURE_KEYS}
+    strings = [d for d in _as_list(node.get("dependencies")) if isinstance(d, str)]
+    if strings:
+        config["dependencies"] = strings
+    return config
+
+
+def _compact_node(node: dict) -> dict:
+    deps = _as_list(node.get("dependencies"))
+    compact_node: dict = {"name": node["name"]}
+    strings = [d for d in deps if isinstance(d, str)]
+    requires = [d["name"] for d in deps if isinstance(d, dict)]
+    if strings:
+        compact_node["dependencies"] = strings
+    if requires:
+        compact_node["requires"] = requires
+    compact_node.update((k, v) for k, v in node.items() if k not in STRUCTURE_KEYS)
+    return compact_node
+
+
+def compact(forest: list[dict]) -> dict:
+    """
+    将嵌套的依赖森林转换为紧凑形式.
+
+    同名节点只保留一个定义，紧凑形式中它的配置作用于每个依赖它的父包，
+    因此同一个包在不同位置的配置 (包括没有配置的位置) 必须一致.
+    每个节点对象只访问一次，共享的节点不会被重复展开.
+
+    Raises:
+        ValueError: 同一个包在不同位置的配置不同.
+    """
+    roots = [root["name"] for root in forest]
+    distinct: dict[str, dict] = {}
+    visited: set[int] = set()
+    stack = list(reversed(forest))
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        name = node["name"]
+        if name not in distinct:
+            distinct[name] = node
+        elif _config(node) != _config(distinct[name]):
+            raise ValueError(
+                f"软件包 '{name}' 在多个位置的配置不同 ({_config(distinct[name])} 与 {_config(node)})，"
+                "紧凑形式中每个包只能有一份配置"
+            )
+        children = [d for d in _as_list(node.get("dependencies")) if isinstance(d, dict)]
+        stack.extend(reversed(children))
+
+    return {
+        "packages": [_compact_node(distinct[name]) for name in roots],
+        "nodes": [_compact_node(distinct[name]) for name in sorted(distinct) if name not in roots],
+    }
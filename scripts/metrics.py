@@ -0,0 +1,185 @@
+"""
+脚本共用的结构化指标和性能分析工具。
+
+各脚本通过 add_arguments() 获得统一的命令行参数:
+    --metrics-json PATH   将本次运行的指标写入 JSON (适合作为 CI artifact 上传)
+    --profile PATH        用 cProfile 分析主线程，结果写入 PATH (用 python -m pstats PATH 查看)
+
+指标 JSON 的结构:
+    {
+      "script": 脚本名, "started_at": ..., "wall_seconds": ..., "exit_code": ...,
+      "phases":     {阶段: 秒数},
+      "counters":   {名称: 计数},
+      "timings":    {名称: {"count", "total_seconds", "max_seconds", "histogram_ms": {"<=1": n, ..., "+Inf": n}}},
+      "caches":     {类别: {"hits": {来源: n}, "misses": n, "hit_rate": ...}},
+      "items":      {分组: {键: {...}}}      例如每个软件包的解压字节数和解析耗时
+    }
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的桶上限 (毫秒)
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Metrics:
+    """线程安全的指标收集器，查询可能在线程池中进行"""
+
+    def __init__(self, script):
+        self.script = script
+        self.started_at = time.time()
+        self.phases = {}
+        self.counters = {}
+        self.timings = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self.items = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        """记录一次耗时，计入 name 的直方图"""
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {
+                    "count": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1),
+                }
+            timing["count"] += 1
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+            milliseconds = seconds * 1000
+            index = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if milliseconds <= bound), -1)
+            timing["buckets"][index] += 1
+
+    @contextmanager
+    def phase(self, name):
+        """统计一个阶段的总耗时，同名阶段多次进入时累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def cache_hit(self, kind, source="memory"):
+        with self._lock:
+            hits = self.cache_hits.setdefault(kind, {})
+            hits[source] = hits.get(source, 0) + 1
+
+    def cache_miss(self, kind):
+        with self._lock:
+            self.cache_misses[kind] = self.cache_misses.get(kind, 0) + 1
+
+    def item(self, group, key, **values):
+        """记录单个对象 (如一个软件包) 的指标"""
+        with self._lock:
+            self.items.setdefault(group, {}).setdefault(key, {}).update(values)
+
+    def to_dict(self, exit_code=None):
+        with self._lock:
+            timings = {}
+            for name, timing in sorted(self.timings.items()):
+                labels = [f"<={bound}" for bound in HISTOGRAM_BUCKETS_MS] + ["+Inf"]
+                timings[name] = {
+                    "count": timing["count"],
+                    "total_seconds": round(timing["total_seconds"], 6),
+                    "max_seconds": round(timing["max_seconds"], 6),
+                    "histogram_ms": dict(zip(labels, timing["buckets"])),
+                }
+            caches = {}
+            for kind in sorted(set(self.cache_hits) | set(self.cache_misses)):
+                hits = self.cache_hits.get(kind, {})
+                misses = self.cache_misses.get(kind, 0)
+                total = sum(hits.values()) + misses
+                caches[kind] = {
+                    "hits": dict(sorted(hits.items())),
+                    "misses": misses,
+                    "hit_rate": round(sum(hits.values()) / total, 4) if total else None,
+                }
+            return {
+                "script": self.script,
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started_at)),
+                "wall_seconds": round(time.perf_counter() - self._start, 6),
+                "exit_code": exit_code,
+                "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "counters": dict(sorted(self.counters.items())),
+                "timings": timings,
+                "caches": caches,
+                "items": self.items,
+            }
+
+    def write(self, path, exit_code=None):
+        _ensure_parent(path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(exit_code), f, indent=2, ensure_ascii=False)
+
+
+def _ensure_parent(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def add_arguments(parser):
+    """为脚本添加 --metrics-json 和 --profile 参数"""
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="可选: 将请求数、耗时直方图、缓存命中率等指标写入 JSON 文件.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="可选: 使用 cProfile 分析主线程 (不含线程池和进程池), 结果写入 PATH, 可用 python -m pstats 查看.",
+    )
+
+
+@contextmanager
+def instrument(args, collector):
+    """
+    按 --profile / --metrics-json 参数包装脚本主体。
+
+    即使主体调用 sys.exit() 或抛出异常，也会写出已收集的指标和性能分析结果。
+    """
+    profiler = cProfile.Profile() if args.profile else None
+    exit_code = 0
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    except BaseException:
+        exit_code = 1
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            try:
+                _ensure_parent(args.profile)
+                profiler.dump_stats(args.profile)
+                print(f"Profile written to '{args.profile}'.", file=sys.stderr)
+            except OSError as e:
+                print(f"Warning: Could not write profile '{args.profile}': {e}", file=sys.stderr)
+        if args.metrics_json:
+            try:
+                collector.write(args.metrics_json, exit_code)
+                print(f"Metrics written to '{args.metrics_json}'.", file=sys.stderr)
+            except OSError as e:
+                print(f"Warning: Could not write metrics '{args.metrics_json}': {e}", file=sys.stderr)
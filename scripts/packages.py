@@ -1,43 +1,106 @@
-import os
+import argparse
+import hashlib
 import json
+import os
 import tarfile
-import zstandard
+import time
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import zstandard
+
+import fileindex
+import metrics
+import repodb
+import siteindex
+import vercmp
 
 # --- 配置 ---
 # 如果目录不存在，主程序会尝试搜索当前目录作为备选
 PKG_DIR = "x86_64"
 OUTPUT_FILE = "packages.json"
 PKG_SUFFIX = ".pkg.tar.zst"
+# 元数据缓存格式版本，格式变化时递增以自动废弃旧缓存
+CACHE_VERSION = 1
+# 查找 .PKGINFO 时允许读取的解压后字节数上限 (0 表示不限制)
+DEFAULT_READ_BUDGET = 64 * 1024 * 1024
+# 解析耗时、解压字节数等指标，由 --metrics-json 写出 (只在主进程中记录)
+METRICS = metrics.Metrics("packages")
 
 
-def _extract_pkginfo_content(pkg_path):
-    """辅助函数：从压缩包中安全提取 .PKGINFO 的原始内容"""
-    with open(pkg_path, "rb") as f:
-        dctx = zstandard.ZstdDecompressor()
-        # 合并上下文管理以减少缩进
-        with dctx.stream_reader(f) as reader, tarfile.open(fileobj=reader, mode="r|") as tar:
-            for member in tar:
-                if member.name != ".PKGINFO":
-                    continue
-                f_obj = tar.extractfile(member)
-                return f_obj.read().decode("utf-8") if f_obj else ""
-    return None
+class ReadBudgetExceeded(Exception):
+    """解压出的数据量超过了读取预算"""
+
+
+class _CountingReader:
+    """包装解压流，统计已读取的解压后字节数，并在超出预算时中止读取"""
+
+    def __init__(self, raw, budget=0):
+        self._raw = raw
+        self.budget = budget
+        self.bytes_read = 0
 
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self.bytes_read += len(data)
+        if self.budget and self.bytes_read > self.budget:
+            raise ReadBudgetExceeded(f"metadata not found within the first {self.budget} decompressed bytes")
+        return data
 
-def parse_pkginfo(pkg_path):
+
+def read_package_metadata(fileobj, read_budget=DEFAULT_READ_BUDGET, collect_files=False):
     """
-    解析 .PKGINFO 并提取元数据。使用扁平化逻辑提高可读性。
+    从已打开的软件包流中读取 .PKGINFO，可选地在同一次解压中收集文件列表。
+
+    makepkg 总是将元数据成员 (.PKGINFO, .BUILDINFO, .MTREE 等) 放在归档最前面，
+    因此一旦遇到普通文件即可停止，不必解压整个软件包。文件列表优先从 .MTREE 读取；
+    只有缺少 .MTREE (或无法解析) 时才需要遍历全部成员，此时不受读取预算限制。
+
+    Returns:
+        tuple: (.PKGINFO 内容或 None, 已读取的解压后字节数, 文件列表或 None)
+            文件列表与 repo-add 生成的 files 条目一致：不含以 "." 开头的元数据成员，
+            目录以 "/" 结尾，按字节序排序。
     """
-    try:
-        content = _extract_pkginfo_content(pkg_path)
-    except Exception as e:
-        print(f"Error processing file '{os.path.basename(pkg_path)}': {e}")
-        return None
+    dctx = zstandard.ZstdDecompressor()
+    content = None
+    mtree_files = None
+    member_files = []
+    # 调用方负责关闭 fileobj (它也可能是一个 mmap)
+    with dctx.stream_reader(fileobj, closefd=False) as raw_reader:
+        reader = _CountingReader(raw_reader, 0 if collect_files else read_budget)
+        with tarfile.open(fileobj=reader, mode="r|") as tar:
+            for member in tar:
+                if member.name == ".PKGINFO":
+                    f_obj = tar.extractfile(member)
+                    content = f_obj.read().decode("utf-8") if f_obj else ""
+                    if not collect_files:
+                        break
+                    continue
+                if member.name == ".MTREE" and collect_files:
+                    f_obj = tar.extractfile(member)
+                    try:
+                        mtree_files = fileindex.parse_mtree(f_obj.read()) if f_obj else None
+                    except (OSError, EOFError, ValueError):
+                        mtree_files = None
+                    continue
+                if member.name.startswith("."):
+                    continue
+                # 已越过开头的元数据区，.PKGINFO 和 .MTREE 不可能再出现
+                if not collect_files or mtree_files is not None:
+                    break
+                member_files.append(member.name + "/" if member.isdir() else member.name)
+
+    if not collect_files:
+        return content, reader.bytes_read, None
+    if mtree_files is not None:
+        return content, reader.bytes_read, mtree_files
+    member_files.sort(key=lambda name: name.encode("utf-8"))
+    return content, reader.bytes_read, member_files
 
-    if content is None:
-        return None
 
+def _parse_pkginfo_content(content):
+    """将 .PKGINFO 文本解析为字典：单一值转为标量，多个值保留为列表"""
     raw = defaultdict(list)
     for line in content.splitlines():
         line = line.strip()
@@ -51,10 +114,186 @@ def parse_pkginfo(pkg_path):
     return {k: v[0] if len(v) == 1 else v for k, v in raw.items()}
 
 
-def main():
+def build_entry(filename, pkg_info, file_size_bytes):
+    """根据 .PKGINFO 元数据和文件大小组织 packages.json 中的单个条目"""
+    # 保证原有输出核心字段不变 (name, version, arch, size, filename)
+    entry = {
+        "name": pkg_info.get("pkgname", "unknown"),
+        "version": pkg_info.get("pkgver", "unknown"),
+        "arch": pkg_info.get("arch", "unknown"),
+        "size": file_size_bytes,  # 这里的 size 保持为文件压缩大小
+        "filename": filename,
+    }
+
+    # 提取所有其他可能的元资料
+    for key, value in pkg_info.items():
+        # 排除已明确映射的字段
+        if key in ["pkgname", "pkgver"]:
+            continue
+
+        # size 字段在 PKGINFO 中是安装后的解压大小
+        # 为避免与外层 'size' 冲突，重命名为 installed_size
+        if key == "size":
+            try:
+                entry["installed_size"] = int(value)
+            except (ValueError, TypeError):
+                entry["installed_size"] = value
+        elif key == "builddate":
+            try:
+                entry["builddate"] = int(value)
+            except (ValueError, TypeError):
+                entry["builddate"] = value
+        elif key == "arch":
+            # arch 已在 entry 中，确保它是最新的
+            entry["arch"] = value
+        else:
+            # 其他所有字段 (pkgdesc, url, depend 等) 直接加入
+            entry[key] = value
+
+    return entry
+
+
+def _file_sha256(file_path):
+    """计算文件的 sha256，用于在 mtime 失效 (例如从 CI 缓存恢复) 时确认内容未变"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cache(cache_path):
     """
-    主函数，扫码目录并提取所有包的元数据。
+    读取元数据缓存文件。
+
+    缓存文件不存在、损坏或版本不匹配时返回空字典，即从冷缓存开始。
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read cache '{cache_path}': {e}. Starting with an empty cache.")
+        return {}
+
+    if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+        print(f"Warning: Cache '{cache_path}' has an incompatible format. Starting with an empty cache.")
+        return {}
+    entries = data.get("entries", {})
+    return entries if isinstance(entries, dict) else {}
+
+
+def save_cache(cache_path, entries):
+    """原子地写入元数据缓存文件，避免中断时留下半写的文件"""
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "entries": entries}, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def scan_package(file_path, cached=None, use_hash=False, read_budget=DEFAULT_READ_BUDGET, collect_files=False):
     """
+    处理单个软件包文件，可在工作进程中运行。
+
+    日志不直接打印，而是随结果一并返回，由主进程按文件顺序输出，
+    避免多进程下输出交错。
+
+    Args:
+        file_path (str): 软件包路径。
+        cached (dict | None): 该文件名在缓存中的记录。
+        use_hash (bool): mtime 不匹配时，是否用 sha256 确认内容是否变化。
+            校验需要读取整个文件，通常比在读取预算内重新解析更慢。
+        read_budget (int): 查找 .PKGINFO 时允许读取的解压后字节数上限。
+        collect_files (bool): 是否在同一次解压中收集文件列表 (记录在 "files" 中)。
+
+    Returns:
+        tuple: (缓存记录或 None, 日志消息列表, 是否命中缓存, 读取的解压后字节数, 解压和解析耗时)
+    """
+    filename = os.path.basename(file_path)
+    messages = []
+
+    # 1. 获取文件大小 (压缩后的包大小) 和修改时间
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        messages.append(f"Warning: Could not find file '{file_path}' to get size. Skipping.")
+        return None, messages, False, 0, 0.0
+
+    # 2. 检查缓存：大小和 mtime 一致，或内容哈希一致，则无需解压
+    sha256 = None
+    if collect_files and cached and "files" not in cached:
+        # 缓存中没有文件列表，仍需打开软件包
+        cached = None
+    if cached and cached.get("size") == stat.st_size:
+        if cached.get("mtime_ns") == stat.st_mtime_ns:
+            return cached, messages, True, 0, 0.0
+        if use_hash and cached.get("sha256"):
+            sha256 = _file_sha256(file_path)
+            if sha256 == cached["sha256"]:
+                return dict(cached, mtime_ns=stat.st_mtime_ns), messages, True, 0, 0.0
+
+    # 3. 从包内部解析元数据
+    bytes_read = 0
+    files = None
+    start = time.perf_counter()
+    try:
+        with open(file_path, "rb") as f:
+            content, bytes_read, files = read_package_metadata(f, read_budget, collect_files)
+    except Exception as e:
+        messages.append(f"Error processing file '{filename}': {e}")
+        content = None
+
+    pkg_info = _parse_pkginfo_content(content) if content is not None else None
+    parse_seconds = time.perf_counter() - start
+    if not pkg_info:
+        messages.append(f"Warning: Could not parse metadata from '{filename}'. Skipping.")
+        return None, messages, False, bytes_read, parse_seconds
+
+    record = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "pkginfo": pkg_info}
+    if use_hash:
+        record["sha256"] = sha256 or _file_sha256(file_path)
+    if files is not None:
+        record["files"] = files
+    return record, messages, False, bytes_read, parse_seconds
+
+
+def scan_packages(
+    file_paths, jobs, cache=None, use_hash=False, read_budget=DEFAULT_READ_BUDGET, collect_files=False
+):
+    """
+    扫描一组软件包文件，jobs > 1 时使用进程池并行解压和解析。
+
+    结果顺序与输入顺序一致，保证输出确定。
+    """
+    cache = cache or {}
+    cached_records = [cache.get(os.path.basename(p)) for p in file_paths]
+    worker = partial(scan_package, use_hash=use_hash, read_budget=read_budget, collect_files=collect_files)
+
+    if jobs <= 1 or len(file_paths) <= 1:
+        yield from map(worker, file_paths, cached_records)
+        return
+
+    jobs = min(jobs, len(file_paths))
+    # 适当增大 chunksize，减少进程间通信开销
+    chunksize = max(1, len(file_paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(worker, file_paths, cached_records, chunksize=chunksize)
+
+
+def collect_from_directory(args, file_lists=None):
+    """
+    扫描软件包目录，返回 packages.json 条目列表。
+
+    file_lists 不为 None 时，同时收集每个软件包的文件列表 (文件名 -> 文件列表)。
+    目录不存在时写入空的输出文件并返回 None。
+    """
+    jobs = max(1, args.jobs)
+    cache = load_cache(args.cache)
+
     # 路径检查与备选方案
     search_dir = PKG_DIR
     if not os.path.isdir(search_dir):
@@ -67,70 +306,255 @@ def main():
                 os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
                 with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
                     json.dump([], f)
-            return
+            return None
 
-    print(f"Starting robust package scan in './{search_dir}'...")
+    print(f"Starting robust package scan in './{search_dir}' with {jobs} job(s)...")
     packages_list = []
 
-    for filename in os.listdir(search_dir):
-        if not filename.endswith(PKG_SUFFIX):
+    # 排序文件列表，使日志输出与结果顺序不依赖于文件系统
+    file_paths = [
+        os.path.join(search_dir, filename)
+        for filename in sorted(os.listdir(search_dir))
+        if filename.endswith(PKG_SUFFIX)
+    ]
+
+    new_cache = {}
+    hits = 0
+    total_bytes_read = 0
+    for file_path, (record, messages, hit, bytes_read, parse_seconds) in zip(
+        file_paths,
+        scan_packages(file_paths, jobs, cache, args.cache_hash, args.read_budget, file_lists is not None),
+    ):
+        filename = os.path.basename(file_path)
+        total_bytes_read += bytes_read
+        METRICS.item(
+            "packages", filename, decompressed_bytes=bytes_read, parse_seconds=round(parse_seconds, 6), cached=hit
+        )
+        if hit:
+            METRICS.cache_hit("metadata", "cache_file")
+        else:
+            METRICS.observe("parse", parse_seconds)
+            if args.cache:
+                METRICS.cache_miss("metadata")
+        if args.verbose and not hit:
+            print(f"Read {bytes_read} decompressed bytes from '{filename}'.")
+        for message in messages:
+            print(message)
+        if record is None:
             continue
 
-        file_path = os.path.join(search_dir, filename)
+        hits += hit
+        # 只保留本次仍存在的文件，已删除的包会自动从缓存中淘汰
+        new_cache[filename] = record
+        packages_list.append(build_entry(filename, record["pkginfo"], record["size"]))
+        if file_lists is not None and "files" in record:
+            file_lists[filename] = record["files"]
 
-        # 1. 从包内部解析元数据
-        pkg_info = parse_pkginfo(file_path)
+    print(f"Read {total_bytes_read} decompressed bytes in total.")
+    METRICS.count("decompressed_bytes", total_bytes_read)
+    METRICS.count("packages_scanned", len(file_paths))
+    if args.cache:
+        evicted = len(set(cache) - set(new_cache))
+        print(f"Cache: {hits} hit(s), {len(new_cache) - hits} miss(es), {evicted} evicted.")
+        try:
+            save_cache(args.cache, new_cache)
+        except OSError as e:
+            print(f"Warning: Could not write cache '{args.cache}': {e}")
 
-        if not pkg_info:
-            print(f"Warning: Could not parse metadata from '{filename}'. Skipping.")
-            continue
+    return packages_list
 
-        # 2. 获取文件大小 (压缩后的包大小)
-        try:
-            file_size_bytes = os.path.getsize(file_path)
-        except FileNotFoundError:
-            print(f"Warning: Could not find file '{file_path}' to get size. Skipping.")
-            continue
 
-        # 3. 组织数据
-        # 保证原有输出核心字段不变 (name, version, arch, size, filename)
-        entry = {
-            "name": pkg_info.get("pkgname", "unknown"),
-            "version": pkg_info.get("pkgver", "unknown"),
-            "arch": pkg_info.get("arch", "unknown"),
-            "size": file_size_bytes,  # 这里的 size 保持为文件压缩大小
-            "filename": filename,
-        }
-
-        # 提取所有其他可能的元资料
-        for key, value in pkg_info.items():
-            # 排除已明确映射的字段
-            if key in ["pkgname", "pkgver"]:
+def collect_from_db(db_path, file_lists=None):
+    """
+    从 repo-add 生成的仓库数据库读取元数据，返回 packages.json 条目列表。
+
+    只需顺序读取一个由小 desc 文件组成的 tar 包，无需打开任何软件包。
+    file_lists 不为 None 时，同时读取 files 数据库 (如 our.files.tar.gz) 中的文件列表。
+    """
+    print(f"Reading package metadata from repository database '{db_path}'...")
+    packages_list = []
+    members = ("desc",) if file_lists is None else ("desc", "files")
+    try:
+        for entry_files in repodb.iter_db_entries(db_path, members):
+            fields = entry_files.get("desc", {})
+            filename = (fields.get("FILENAME") or [""])[0]
+            pkg_info = repodb.desc_to_pkginfo(fields)
+            if not filename or not pkg_info:
+                print(f"Warning: Incomplete database entry for '{filename or 'unknown'}'. Skipping.")
+                continue
+
+            try:
+                csize = int(fields["CSIZE"][0])
+            except (KeyError, IndexError, ValueError):
+                print(f"Warning: Missing package size for '{filename}' in database. Skipping.")
                 continue
+            packages_list.append(build_entry(filename, pkg_info, csize))
+            if file_lists is not None and "files" in entry_files:
+                file_lists[filename] = entry_files["files"].get("FILES", [])
+    except (OSError, tarfile.TarError, UnicodeDecodeError) as e:
+        print(f"Error: Could not read repository database '{db_path}': {e}")
+        return None
+
+    METRICS.count("db_entries", len(packages_list))
+    return packages_list
 
-            # size 字段在 PKGINFO 中是安装后的解压大小
-            # 为避免与外层 'size' 冲突，重命名为 installed_size
-            if key == "size":
-                try:
-                    entry["installed_size"] = int(value)
-                except (ValueError, TypeError):
-                    entry["installed_size"] = value
-            elif key == "builddate":
-                try:
-                    entry["builddate"] = int(value)
-                except (ValueError, TypeError):
-                    entry["builddate"] = value
-            elif key == "arch":
-                # arch 已在 entry 中，确保它是最新的
-                entry["arch"] = value
-            else:
-                # 其他所有字段 (pkgdesc, url, depend 等) 直接加入
-                entry[key] = value
-
-        packages_list.append(entry)
-
-    # 按软件包名称字母顺序排序
-    packages_list.sort(key=lambda p: p["name"].lower())
+
+def merge_versions(packages_list):
+    """
+    同一软件包 (pkgname 与架构相同) 存在多个版本时只保留最新的条目，
+    较旧的版本按从新到旧的顺序记录在其 previous_versions 字段中。
+    """
+    groups = vercmp.group_by_package(packages_list, key=lambda p: (p["name"], p["version"], p["arch"]))
+    merged = []
+    for versions in groups.values():
+        latest = versions[0][1]
+        latest["previous_versions"] = [
+            {"version": p["version"], "filename": p["filename"], "size": p["size"]} for _, p in versions[1:]
+        ]
+        merged.append(latest)
+    return merged
+
+
+def write_file_reports(packages_list, file_lists, index_path=None, conflicts_path=None):
+    """写出文件归属索引和冲突报告，同名软件包只统计最新版本"""
+    owned = {p["name"]: file_lists[p["filename"]] for p in packages_list if p["filename"] in file_lists}
+    missing = len(packages_list) - len(owned)
+    if missing:
+        print(f"Warning: No file list for {missing} package(s); they are left out of the file reports.")
+
+    for path in (index_path, conflicts_path):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if index_path:
+        index = fileindex.build_file_index(owned)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+        print(f"File index for {len(index['name'])} path(s) has been written to '{index_path}'.")
+
+    if conflicts_path:
+        conflicts = fileindex.find_conflicts(owned)
+        with open(conflicts_path, "w", encoding="utf-8") as f:
+            json.dump({"count": len(conflicts), "conflicts": conflicts}, f, indent=2, ensure_ascii=False)
+        print(f"Found {len(conflicts)} path(s) owned by more than one package, see '{conflicts_path}'.")
+
+
+def attach_deltas(packages_list, deltas_path):
+    """
+    将 deltas.json 中的差分信息附加到对应文件名的条目上.
+
+    delta.sha256 是还原出的未压缩 .pkg.tar 的哈希，而不是 .pkg.tar.zst 的哈希.
+    """
+    try:
+        with open(deltas_path, "r", encoding="utf-8") as f:
+            deltas = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read deltas '{deltas_path}': {e}")
+        return
+    for entry in packages_list:
+        delta = deltas.get(entry["filename"])
+        if delta:
+            entry["delta"] = {
+                "filename": delta["filename"],
+                "size": delta["size"],
+                "base_version": delta["base_version"],
+                "base_filename": delta["base_filename"],
+                "sha256": delta["target_sha256"],
+            }
+
+
+def main():
+    """
+    主函数，扫码目录并提取所有包的元数据。
+    """
+    parser = argparse.ArgumentParser(description="扫描软件包目录并生成 packages.json。")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="并行解析软件包的进程数 (默认: CPU 核心数). 设为 1 则串行处理.",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="可选: 元数据缓存文件路径. 大小和 mtime 未变的软件包将跳过解压.",
+    )
+    parser.add_argument(
+        "--cache-hash",
+        action="store_true",
+        help="mtime 变化时使用 sha256 确认内容是否变化 (适用于从 CI 缓存恢复的场景). "
+        "注意: 校验要读取整个压缩包, 而重新解析通常只需解压开头的元数据 (最多 --read-budget 字节), "
+        "对几 GB 的大软件包往往比直接重新解析更慢; 只有需要完整解压时 (例如 --file-index 且缺少 .MTREE) 才划算.",
+    )
+    parser.add_argument(
+        "--read-budget",
+        type=int,
+        default=DEFAULT_READ_BUDGET,
+        metavar="BYTES",
+        help=f"查找 .PKGINFO 时每个包最多读取的解压后字节数, 0 表示不限制 (默认: {DEFAULT_READ_BUDGET}).",
+    )
+    parser.add_argument(
+        "--verbose", "-v", action="store_true", default=False, help="打印每个包读取的解压后字节数."
+    )
+    parser.add_argument(
+        "--from-db",
+        metavar="DB_PATH",
+        help="可选: 直接从 repo-add 生成的仓库数据库 (如 x86_64/our.db.tar.gz) 读取元数据, 不再打开软件包.",
+    )
+    parser.add_argument(
+        "--deltas",
+        metavar="PATH",
+        help="可选: delta.py 生成的 deltas.json, 将差分大小和基准版本写入对应条目的 delta 字段.",
+    )
+    parser.add_argument(
+        "--split-dir",
+        metavar="DIR",
+        help="可选: 额外为网站生成精简的摘要索引 index.json (及 .gz/.br 预压缩副本).",
+    )
+    parser.add_argument(
+        "--split-report",
+        metavar="PATH",
+        help="可选: 将摘要索引与完整 packages.json 的大小和解析时间对比写入 JSON 报告.",
+    )
+    parser.add_argument(
+        "--file-index",
+        metavar="PATH",
+        help="可选: 收集文件列表并写出 路径 -> 软件包 的归属索引 (--from-db 时需使用 files 数据库, 如 our.files.tar.gz).",
+    )
+    parser.add_argument(
+        "--conflicts",
+        metavar="PATH",
+        help="可选: 收集文件列表并写出被多个软件包同时拥有的文件报告.",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    with metrics.instrument(args, METRICS):
+        generate(args)
+
+
+def generate(args):
+    """按命令行参数收集元数据，写出 packages.json 及可选的各类索引"""
+    file_lists = {} if args.file_index or args.conflicts else None
+    with METRICS.phase("collect"):
+        if args.from_db:
+            packages_list = collect_from_db(args.from_db, file_lists)
+        else:
+            packages_list = collect_from_directory(args, file_lists)
+    if packages_list is None:
+        return
+
+    with METRICS.phase("merge_versions"):
+        packages_list = merge_versions(packages_list)
+    if file_lists is not None:
+        with METRICS.phase("file_reports"):
+            write_file_reports(packages_list, file_lists, args.file_index, args.conflicts)
+    if args.deltas:
+        attach_deltas(packages_list, args.deltas)
+
+    # 按软件包名称字母顺序排序 (文件名作为次序键，保证结果稳定)
+    packages_list.sort(key=lambda p: (p["name"].lower(), p["filename"]))
 
     # 4. 生成 JSON 文件
     # 确保目标目录存在
@@ -139,12 +563,22 @@ def main():
         os.makedirs(output_dir, exist_ok=True)
 
     try:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        with METRICS.phase("write_json"), open(OUTPUT_FILE, "w", encoding="utf-8") as f:
             json.dump(packages_list, f, indent=2, ensure_ascii=False)
         print(f"\nSuccess! Found and processed {len(packages_list)} packages.")
         print(f"Package data has been written to '{OUTPUT_FILE}'.")
     except IOError as e:
         print(f"Error writing to file '{OUTPUT_FILE}': {e}")
+        return
+
+    if args.split_dir:
+        with METRICS.phase("split_index"):
+            stats = siteindex.write_split(packages_list, args.split_dir)
+        print(f"Split index has been written to '{args.split_dir}'.")
+        report = siteindex.compare_report(OUTPUT_FILE, args.split_dir)
+        if args.split_report:
+            with open(args.split_report, "w", encoding="utf-8") as f:
+                json.dump({"files": stats, "comparison": report}, f, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,313 @@
+"""
+增量更新 pacman 仓库数据库，替代 repo-add.sh 每次发布都对全部软件包的完整重建。
+
+- 沿用已有 <repo>.files.tar.gz (或 <repo>.db.tar.gz) 中未变化软件包的条目
+  (文件名和大小一致，且文件早于数据库写入)，只打开新增或重新构建的软件包：
+  通过 mmap 计算 sha256，并在同一次解压中读取 .PKGINFO 和文件列表；
+- 新增的软件包在进程池中并行处理；
+- 按 pacman 的版本比较规则，同名软件包只有最新版本写入数据库，--keep 可同时清理旧版本文件；
+  目录中已不存在的软件包从数据库中移除；
+- 一次顺序写出 db 和 files 两个数据库，再按 repo-add.sh 的方式复制为 <repo>.db / <repo>.files 并签名。
+
+之后 packages.py --from-db 直接读取生成的数据库，每个软件包在一次发布中至多被打开一次。
+增量模式需要目录中保留上一次生成的数据库；发布工作流每次只下载本次构建的软件包，因此总是完整生成。
+"""
+
+import argparse
+import base64
+import hashlib
+import mmap
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import packages
+import repodb
+import vercmp
+
+
+def _db_paths(repo_dir, repo_name):
+    return (
+        os.path.join(repo_dir, f"{repo_name}.db.tar.gz"),
+        os.path.join(repo_dir, f"{repo_name}.files.tar.gz"),
+    )
+
+
+def load_existing_entries(repo_dir, repo_name):
+    """
+    读取已有的仓库数据库。
+
+    优先读取 files 数据库，它同时包含 desc 和文件列表；只有 db 时，
+    条目缺少文件列表，对应软件包需要重新扫描。
+
+    Returns:
+        tuple: (FILENAME 到条目的映射, 所读数据库的修改时间 (纳秒)，没有数据库时为 None)
+    """
+    db_path, files_path = _db_paths(repo_dir, repo_name)
+    for path, members in ((files_path, ("desc", "files")), (db_path, ("desc",))):
+        if not os.path.exists(path):
+            continue
+        entries = {}
+        db_mtime = os.stat(path).st_mtime_ns
+        try:
+            for entry in repodb.iter_db_entries(path, members):
+                desc = entry.get("desc", {})
+                filename = (desc.get("FILENAME") or [""])[0]
+                if not filename:
+                    continue
+                record = {"desc": desc}
+                if "files" in entry:
+                    record["files"] = entry["files"].get("FILES", [])
+                entries[filename] = record
+        except (OSError, tarfile.TarError, UnicodeDecodeError) as e:
+            print(f"Warning: Could not read existing database '{path}': {e}. Rebuilding from scratch.")
+            return {}, None
+        return entries, db_mtime
+    return {}, None
+
+
+def scan_new_package(file_path, include_sigs=False):
+    """
+    处理一个新增的软件包，可在工作进程中运行。
+
+    文件只打开一次：sha256 直接在 mmap 上计算，随后从同一映射中流式解压读取
+    .PKGINFO 和文件列表。
+
+    Returns:
+        tuple: (条目或 None, 日志消息列表)
+    """
+    filename = os.path.basename(file_path)
+    try:
+        with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            csize = len(mm)
+            sha256 = hashlib.sha256(mm).hexdigest()
+            content, _, files = packages.read_package_metadata(mm, collect_files=True)
+    except Exception as e:
+        return None, [f"Error processing file '{filename}': {e}"]
+
+    pkg_info = packages._parse_pkginfo_content(content) if content is not None else None
+    if not pkg_info or "pkgname" not in pkg_info or "pkgver" not in pkg_info:
+        return None, [f"Warning: Could not parse metadata from '{filename}'. Skipping."]
+
+    pgpsig = None
+    sig_path = f"{file_path}.sig"
+    if include_sigs and os.path.exists(sig_path):
+        with open(sig_path, "rb") as f:
+            pgpsig = base64.b64encode(f.read()).decode("ascii")
+
+    desc = repodb.pkginfo_to_desc(pkg_info, filename, csize, sha256, pgpsig)
+    return {"desc": desc, "files": files}, []
+
+
+def scan_new_packages(file_paths, jobs, include_sigs=False):
+    """并行扫描新增的软件包，结果顺序与输入顺序一致"""
+    worker = partial(scan_new_package, include_sigs=include_sigs)
+    if jobs <= 1 or len(file_paths) <= 1:
+        yield from map(worker, file_paths)
+        return
+    with ProcessPoolExecutor(max_workers=min(jobs, len(file_paths))) as executor:
+        yield from executor.map(worker, file_paths)
+
+
+def select_latest(entries):
+    """
+    按版本比较规则，同名软件包只保留最新的一个。
+
+    Returns:
+        tuple: (保留的条目列表, 被取代的条目列表)
+    """
+    # 数据库中每个 pkgname 只能有一个条目，因此不区分架构
+    groups = vercmp.group_by_package(entries, key=lambda e: (e["desc"]["NAME"][0], e["desc"]["VERSION"][0], None))
+    latest = []
+    superseded = []
+    for versions in groups.values():
+        latest.append(versions[0][1])
+        superseded.extend(entry for _, entry in versions[1:])
+    return latest, superseded
+
+
+def prune_old_versions(repo_dir, filenames, keep, dry_run=False):
+    """
+    每个软件包只保留最新的 keep 个版本的文件 (替代 paccache -r -k N)，连同签名一起删除。
+
+    Returns:
+        list: 保留下来的文件名。
+    """
+    kept, pruned = vercmp.prune(filenames, keep)
+    for filename in pruned:
+        print(f"  -> {'Would remove' if dry_run else 'Removing'} old version: {filename}")
+        if dry_run:
+            continue
+        for path in (os.path.join(repo_dir, filename), os.path.join(repo_dir, f"{filename}.sig")):
+            if os.path.exists(path):
+                os.remove(path)
+    return filenames if dry_run else kept
+
+
+def verify_signature(file_path, required=False):
+    """
+    校验软件包的分离签名 <file_path>.sig。
+
+    签名不存在时，required 为 False 则跳过校验，为 True 则视为失败。
+    注意这与 repo-add --verify 不同：后者校验的是已有数据库文件的签名，而不是软件包的签名。
+    """
+    sig_path = f"{file_path}.sig"
+    if not os.path.exists(sig_path):
+        if required:
+            print(f"Error: Missing signature for '{os.path.basename(file_path)}'.")
+        return not required
+    result = subprocess.run(
+        ["gpg", "--verify", "--batch", sig_path, file_path], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"Error: Signature verification failed for '{os.path.basename(file_path)}':\n{result.stderr}")
+        return False
+    return True
+
+
+def sign_file(path, key=None):
+    """生成分离签名 <path>.sig"""
+    cmd = ["gpg", "--batch", "--yes", "--detach-sign", "--use-agent", "--no-armor"]
+    if key:
+        cmd += ["-u", key]
+    subprocess.run(cmd + ["-o", f"{path}.sig", path], check=True)
+
+
+def publish_copies(repo_dir, repo_name, signed):
+    """与 repo-add.sh 相同，将数据库复制为 <repo>.db / <repo>.files，替换可能存在的符号链接"""
+    for kind in ("db", "files"):
+        source = os.path.join(repo_dir, f"{repo_name}.{kind}.tar.gz")
+        target = os.path.join(repo_dir, f"{repo_name}.{kind}")
+        for path in (target, f"{target}.sig"):
+            if os.path.lexists(path):
+                os.remove(path)
+        shutil.copyfile(source, target)
+        if signed:
+            shutil.copyfile(f"{source}.sig", f"{target}.sig")
+
+
+def check_against(repo_dir, repo_name, reference_dir):
+    """将生成的数据库与 repo-add 在 reference_dir 中生成的数据库逐条目比较"""
+    ours = _db_paths(repo_dir, repo_name)
+    reference = _db_paths(reference_dir, repo_name)
+    differences = repodb.compare_dbs(ours[0], reference[0])
+    differences += repodb.compare_dbs(ours[1], reference[1], members=("desc", "files"))
+    for line in differences:
+        print(f"  {line}")
+    if differences:
+        print(f"==> {len(differences)} difference(s) from repo-add output.")
+        return False
+    print("==> Database contents match repo-add output.")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量更新 pacman 仓库数据库 (repo-add 的纯 Python 替代).")
+    parser.add_argument("repo_name", nargs="?", default="our", help="仓库名称 (默认: our).")
+    parser.add_argument("--dir", default="x86_64", help="软件包目录 (默认: x86_64).")
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="并行处理新增软件包的进程数 (默认: CPU 核心数).",
+    )
+    parser.add_argument("--full", action="store_true", help="忽略已有数据库, 重新扫描所有软件包.")
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="用 gpg 校验新增软件包的 .sig 签名, 失败时中止. 与 --sign 一起使用时, 缺少签名的软件包同样视为失败. "
+        "注意与 repo-add --verify 不同, 后者校验的是已有数据库的签名.",
+    )
+    parser.add_argument("--sign", action="store_true", help="使用 gpg 为生成的数据库签名.")
+    parser.add_argument(
+        "--key",
+        default=os.environ.get("GPG_SIG_KEY") or None,
+        help="签名使用的密钥 (默认: 环境变量 GPG_SIG_KEY).",
+    )
+    parser.add_argument(
+        "--include-sigs", action="store_true", help="将软件包签名以 %%PGPSIG%% 写入数据库 (同 repo-add --include-sigs)."
+    )
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=0,
+        metavar="N",
+        help="每个软件包只保留最新的 N 个版本的文件, 其余连同签名一起删除 (同 paccache -r -k N). 默认 0 表示不删除. "
+        "版本取自文件名, 以 \"<数字>_\" 开头的 pkgver 会被视为改写过的 epoch (见 vercmp.py).",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="只报告 --keep 将删除的文件, 不实际删除.")
+    parser.add_argument(
+        "--check",
+        metavar="REF_DIR",
+        help="将生成的数据库与 repo-add 在 REF_DIR 中生成的同名数据库比较, 存在差异时返回非零.",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        print(f"Error: Directory '{args.dir}' not found.")
+        sys.exit(1)
+
+    existing, db_mtime = ({}, None) if args.full else load_existing_entries(args.dir, args.repo_name)
+    filenames = sorted(f for f in os.listdir(args.dir) if f.endswith(packages.PKG_SUFFIX))
+    if args.keep > 0:
+        filenames = prune_old_versions(args.dir, filenames, args.keep, args.dry_run)
+
+    entries = []
+    new_paths = []
+    for filename in filenames:
+        record = existing.get(filename)
+        stat = os.stat(os.path.join(args.dir, filename))
+        # 文件名包含版本号，大小一致、已有文件列表且早于数据库写入的软件包视为未变化；
+        # 同版本重新构建的软件包大小可能不变，但 sha256 不同，必须重新扫描
+        if (
+            record
+            and record.get("files") is not None
+            and record["desc"].get("CSIZE") == [str(stat.st_size)]
+            and stat.st_mtime_ns < db_mtime
+        ):
+            entries.append(record)
+        else:
+            new_paths.append(os.path.join(args.dir, filename))
+
+    # 为数据库签名时，软件包也必须都已签名 (例如构建分片部分失败时漏签的包不能发布)
+    if args.verify and not all([verify_signature(path, required=args.sign) for path in new_paths]):
+        sys.exit(1)
+
+    unchanged = len(entries)
+    print(f"==> {unchanged} unchanged package(s), scanning {len(new_paths)} new package(s)...")
+    for entry, messages in scan_new_packages(new_paths, max(1, args.jobs), args.include_sigs):
+        for message in messages:
+            print(message)
+        if entry is not None:
+            entries.append(entry)
+
+    entries, superseded = select_latest(entries)
+    for entry in superseded:
+        print(f"  -> Superseded: {entry['desc']['FILENAME'][0]}")
+    removed = set(existing) - set(filenames)
+    for filename in sorted(removed):
+        print(f"  -> Removed: {filename}")
+
+    db_path, files_path = _db_paths(args.dir, args.repo_name)
+    repodb.write_db(db_path, entries)
+    repodb.write_db(files_path, entries, with_files=True)
+    if args.sign:
+        sign_file(db_path, args.key)
+        sign_file(files_path, args.key)
+    publish_copies(args.dir, args.repo_name, args.sign)
+    print(
+        f"==> Wrote {len(entries)} package(s) to '{db_path}' "
+        f"({len(superseded)} superseded, {len(removed)} removed)."
+    )
+
+    if args.check and not check_against(args.dir, args.repo_name, args.check):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+pacman 仓库数据库 (repo-add 生成的 *.db.tar.gz 或 /var/lib/pacman/sync/*.db) 的纯 Python 读写工具。
+
+数据库是一个包含大量小文件的 tar 包，每个软件包对应一个 `<name>-<version>/` 目录，
+其中的 `desc` 文件由若干 `%KEY%` 段组成，每段一行或多行取值，段之间以空行分隔。
+files 数据库在同一目录下额外包含列出软件包全部文件的 `files` 文件。
+"""
+
+import gzip
+import io
+import os
+import tarfile
+import time
+
+# zstd 帧的魔数，pacman 同步数据库可能使用 zstd 压缩
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# desc 字段到 .PKGINFO 键名的映射，便于与 packages.py 的输出保持同一结构
+DESC_TO_PKGINFO = {
+    "NAME": "pkgname",
+    "BASE": "pkgbase",
+    "VERSION": "pkgver",
+    "DESC": "pkgdesc",
+    "URL": "url",
+    "BUILDDATE": "builddate",
+    "PACKAGER": "packager",
+    "ISIZE": "size",
+    "ARCH": "arch",
+    "LICENSE": "license",
+    "GROUPS": "group",
+    "REPLACES": "replaces",
+    "CONFLICTS": "conflict",
+    "PROVIDES": "provides",
+    "DEPENDS": "depend",
+    "OPTDEPENDS": "optdepend",
+    "MAKEDEPENDS": "makedepend",
+    "CHECKDEPENDS": "checkdepend",
+}
+
+# repo-add 写入 desc 时的字段顺序
+DESC_ORDER = (
+    "FILENAME",
+    "NAME",
+    "BASE",
+    "VERSION",
+    "DESC",
+    "GROUPS",
+    "CSIZE",
+    "ISIZE",
+    "SHA256SUM",
+    "PGPSIG",
+    "URL",
+    "LICENSE",
+    "ARCH",
+    "BUILDDATE",
+    "PACKAGER",
+    "REPLACES",
+    "CONFLICTS",
+    "PROVIDES",
+    "DEPENDS",
+    "OPTDEPENDS",
+    "MAKEDEPENDS",
+    "CHECKDEPENDS",
+)
+
+
+def parse_desc(content):
+    """
+    解析 desc 文件内容。
+
+    Returns:
+        dict: 字段名 (不含百分号) 到取值列表的映射。
+    """
+    fields = {}
+    key = None
+    for line in content.splitlines():
+        if line.startswith("%") and line.endswith("%") and len(line) > 2:
+            key = line[1:-1]
+            fields[key] = []
+        elif not line:
+            key = None
+        elif key is not None:
+            fields[key].append(line)
+    return fields
+
+
+def desc_to_pkginfo(fields):
+    """将 desc 字段转换为与 .PKGINFO 解析结果相同形式的字典 (单一值为标量，多个值为列表)"""
+    pkg_info = {}
+    for key, values in fields.items():
+        pkginfo_key = DESC_TO_PKGINFO.get(key)
+        if pkginfo_key is None or not values:
+            continue
+        pkg_info[pkginfo_key] = values[0] if len(values) == 1 else values
+    return pkg_info
+
+
+def _open_db(fileobj):
+    """根据文件头判断压缩格式，返回可流式读取的 tar 对象"""
+    head = fileobj.peek(4)[:4] if hasattr(fileobj, "peek") else b""
+    if head == ZSTD_MAGIC:
+        # 仅在遇到 zstd 压缩的数据库时才需要 zstandard
+        import zstandard
+
+        reader = zstandard.ZstdDecompressor().stream_reader(fileobj)
+        return tarfile.open(fileobj=reader, mode="r|")
+    return tarfile.open(fileobj=fileobj, mode="r|*")
+
+
+def iter_db_entries(db_path, members=("desc",)):
+    """
+    顺序流式读取仓库数据库，逐个产出软件包条目。
+
+    Args:
+        db_path (str): 数据库文件路径。
+        members (tuple): 每个软件包目录下需要读取的文件名，例如 ("desc", "files")。
+
+    Yields:
+        dict: 文件名 (如 "desc") 到解析后字段字典的映射。
+    """
+    current_dir = None
+    current = {}
+    with open(db_path, "rb") as f, _open_db(f) as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            pkg_dir, _, name = member.name.rpartition("/")
+            if name not in members:
+                continue
+            # 同一软件包的成员在数据库中总是相邻的
+            if pkg_dir != current_dir:
+                if current:
+                    yield current
+                current_dir, current = pkg_dir, {}
+            f_obj = tar.extractfile(member)
+            if f_obj:
+                current[name] = parse_desc(f_obj.read().decode("utf-8"))
+    if current:
+        yield current
+
+
+def pkginfo_to_desc(pkg_info, filename, csize, sha256, pgpsig=None):
+    """
+    根据 .PKGINFO 解析结果组织 desc 字段，与 repo-add 写入的内容一致。
+
+    Returns:
+        dict: 字段名到取值列表的映射，可直接交给 format_desc。
+    """
+    fields = {"FILENAME": [filename], "CSIZE": [str(csize)], "SHA256SUM": [sha256]}
+    if pgpsig:
+        fields["PGPSIG"] = [pgpsig]
+    for desc_key, pkginfo_key in DESC_TO_PKGINFO.items():
+        value = pkg_info.get(pkginfo_key)
+        if value is None:
+            continue
+        fields[desc_key] = [str(v) for v in value] if isinstance(value, list) else [str(value)]
+    return fields
+
+
+def format_desc(fields):
+    """按 repo-add 的字段顺序将 desc 字段序列化为文本，空字段不输出"""
+    keys = [k for k in DESC_ORDER if k in fields] + sorted(k for k in fields if k not in DESC_ORDER)
+    parts = []
+    for key in keys:
+        if fields[key]:
+            parts.append(f"%{key}%\n" + "".join(f"{v}\n" for v in fields[key]) + "\n")
+    return "".join(parts)
+
+
+def format_files(files):
+    """将文件列表序列化为 files 数据库中的 files 文件"""
+    return "%FILES%\n" + "".join(f"{name}\n" for name in files) + "\n"
+
+
+def entry_dirname(fields):
+    """软件包在数据库中的目录名: <name>-<version>"""
+    return f"{fields['NAME'][0]}-{fields['VERSION'][0]}"
+
+
+def _add_member(tar, name, data=None, mtime=0):
+    info = tarfile.TarInfo(name)
+    info.mtime = mtime
+    info.uname = info.gname = "root"
+    if data is None:
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        tar.addfile(info)
+    else:
+        info.mode = 0o644
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+
+def write_db(db_path, entries, with_files=False, mtime=None):
+    """
+    一次顺序写出 gzip 压缩的仓库数据库，先写入临时文件再原子替换。
+
+    Args:
+        db_path (str): 输出路径，如 x86_64/our.db.tar.gz。
+        entries (list): 每项为 {"desc": desc 字段, "files": 文件列表 (可选)}。
+        with_files (bool): 是否写出 files 文件，即生成 files 数据库。
+        mtime (int | None): tar 成员的修改时间，默认为当前时间。
+    """
+    mtime = int(time.time()) if mtime is None else mtime
+    tmp_path = f"{db_path}.tmp"
+    # 与 repo-add 一样按目录名排序，输出不依赖于输入顺序
+    ordered = sorted(entries, key=lambda e: entry_dirname(e["desc"]).encode("utf-8"))
+    with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=mtime) as gz:
+        with tarfile.open(fileobj=gz, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for entry in ordered:
+                dirname = entry_dirname(entry["desc"])
+                _add_member(tar, f"{dirname}/", mtime=mtime)
+                _add_member(tar, f"{dirname}/desc", format_desc(entry["desc"]).encode("utf-8"), mtime)
+                if with_files:
+                    files = format_files(entry.get("files") or [])
+                    _add_member(tar, f"{dirname}/files", files.encode("utf-8"), mtime)
+    os.replace(tmp_path, db_path)
+
+
+def compare_dbs(db_path, reference_path, members=("desc",)):
+    """
+    比较两个仓库数据库的内容 (如本工具与 repo-add 的输出)，忽略 tar 与压缩层的差异。
+
+    Returns:
+        list[str]: 差异描述，为空表示 pacman 读取到的内容完全一致。
+    """
+
+    def load(path):
+        return {
+            entry_dirname(entry["desc"]): entry for entry in iter_db_entries(path, members) if "desc" in entry
+        }
+
+    ours, reference = load(db_path), load(reference_path)
+    differences = []
+    for name in sorted(set(ours) | set(reference)):
+        if name not in ours:
+            differences.append(f"{name}: missing")
+            continue
+        if name not in reference:
+            differences.append(f"{name}: unexpected entry")
+            continue
+        for member in members:
+            a, b = ours[name].get(member, {}), reference[name].get(member, {})
+            for key in sorted(set(a) | set(b)):
+                if a.get(key) != b.get(key):
+                    differences.append(f"{name}/{member}: %{key}% differs: {a.get(key)!r} != {b.get(key)!r}")
+    return differences
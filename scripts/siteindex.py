@@ -0,0 +1,108 @@
+"""
+为网站生成精简的软件包索引，替代一次性加载完整的 packages.json。
+
+输出目录结构:
+    index.json           列表视图所需字段的摘要数组
+
+网站只有列表视图，没有搜索和详情页，因此不生成倒排索引或按包拆分的详情文件；
+完整条目仍由 packages.json 提供。
+所有 JSON 都以紧凑格式写出，并生成 .gz 和 .br (需要 brotli 模块) 预压缩副本。
+"""
+
+import gzip
+import json
+import os
+import time
+
+# 网站列表视图 (PackageCard) 使用的字段
+SUMMARY_FIELDS = ("name", "version", "arch", "size", "filename", "pkgdesc", "url", "license", "installed_size")
+
+
+def summarize(entry):
+    """只保留列表视图需要的字段"""
+    return {key: entry[key] for key in SUMMARY_FIELDS if key in entry}
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load_brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def write_with_siblings(path, data, brotli=None):
+    """
+    写出文件及其 .gz / .br 预压缩副本。
+
+    Returns:
+        dict: 各格式的字节数，如 {"raw": ..., "gz": ..., "br": ...}。
+    """
+    sizes = {"raw": len(data)}
+    with open(path, "wb") as f:
+        f.write(data)
+    # mtime=0 使输出可复现，内容不变时文件也不变
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    with open(f"{path}.gz", "wb") as f:
+        f.write(gz)
+    sizes["gz"] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        with open(f"{path}.br", "wb") as f:
+            f.write(br)
+        sizes["br"] = len(br)
+    return sizes
+
+
+def write_split(entries, out_dir):
+    """
+    写出摘要索引。
+
+    Returns:
+        dict: 各输出文件的大小统计。
+    """
+    brotli = _load_brotli()
+    if brotli is None:
+        print("Warning: brotli module not found, skipping .br files.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    summaries = [summarize(entry) for entry in entries]
+    return {"index": write_with_siblings(os.path.join(out_dir, "index.json"), _dumps(summaries), brotli)}
+
+
+def _parse_seconds(data, repeat=5):
+    """多次解析取最短时间，减少抖动的影响"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        json.loads(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare_report(full_json_path, out_dir):
+    """
+    比较完整的 packages.json 与网站首屏实际加载的 index.json。
+
+    Returns:
+        dict: 两者的原始大小、gzip 大小和解析时间。
+    """
+    report = {}
+    for label, path in (("full", full_json_path), ("initial", os.path.join(out_dir, "index.json"))):
+        with open(path, "rb") as f:
+            data = f.read()
+        report[label] = {
+            "raw": len(data),
+            "gz": len(gzip.compress(data, compresslevel=9, mtime=0)),
+            "parse_ms": round(_parse_seconds(data) * 1000, 3),
+        }
+    for label, values in report.items():
+        print(
+            f"{label:>8}: {values['raw']:>10} bytes, {values['gz']:>9} bytes gzipped, "
+            f"parsed in {values['parse_ms']} ms"
+        )
+    return report
@@ -0,0 +1,130 @@
+"""
+scripts/ 下各工具的测试共用的夹具。
+
+scripts/ 中的脚本互相以同级模块导入 (import manifest 等)，这里把该目录加入 sys.path。
+带连字符的命令行脚本 (add-package.py、list-tasks.py) 在导入时就会解析命令行参数，
+因此通过子进程运行，并用 benchmark.py 的桩服务代替 AUR RPC 和官方源搜索接口。
+
+    python -m pytest scripts/tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import yaml
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import benchmark  # noqa: E402
+
+# 子进程的超时时间 (秒)，防止死锁时测试一直挂起
+SCRIPT_TIMEOUT = 60
+
+
+def aur_package(name, depends=(), make_depends=(), provides=(), version="1.0-1", popularity=0):
+    """构造一个 AUR RPC info 格式的软件包条目"""
+    return {
+        "Name": name,
+        "PackageBase": name,
+        "Version": version,
+        "Depends": list(depends),
+        "MakeDepends": list(make_depends),
+        "Provides": list(provides),
+        "Popularity": popularity,
+    }
+
+
+class StubServer:
+    """在后台线程中运行的桩服务，fail_first 个请求返回 503 以测试重试"""
+
+    def __init__(self, aur, official, fail_first=0, fail_status=503):
+        self.state = benchmark.StubState({pkg["Name"]: pkg for pkg in aur}, official)
+        self.failures_left = fail_first
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(benchmark.StubHandler):
+            state = self.state
+
+            def do_GET(self):
+                with stub._lock:
+                    fail = stub.failures_left > 0
+                    stub.failures_left -= fail
+                if fail:
+                    self.state.count("failed")
+                    self.send_error(fail_status)
+                    return
+                super().do_GET()
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    """返回一个启动桩服务的工厂函数，测试结束时关闭所有桩服务"""
+    servers = []
+
+    def start(aur=(), official=(), **kwargs):
+        server = StubServer(aur, official, **kwargs)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def run_script(script, *argv, base_url=None, cwd=None, cache_home=None):
+    """运行 scripts/ 下的脚本，返回 CompletedProcess (输出为文本)"""
+    env = dict(os.environ)
+    if base_url:
+        env.update(benchmark.stub_env(base_url))
+    if cache_home:
+        env["XDG_CACHE_HOME"] = str(cache_home)
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, script), *map(str, argv)],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=SCRIPT_TIMEOUT,
+    )
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    return path
+
+
+def diamond_levels(depth):
+    """菱形依赖图的各层包名: 每层两个包，都依赖下一层的两个包，根到叶子共有 2^depth 条路径"""
+    return [[f"lib{level}a", f"lib{level}b"] for level in range(depth)]
+
+
+def write_diamond_manifest(path, depth, root="app", configs=None):
+    """写出一个菱形依赖图的紧凑清单，configs 为 包名 -> 手工配置 的映射"""
+    configs = configs or {}
+    levels = diamond_levels(depth)
+    nodes = []
+    for level, names in enumerate(levels):
+        requires = levels[level + 1] if level + 1 < depth else []
+        for name in names:
+            nodes.append(dict({"name": name}, **({"requires": requires} if requires else {}), **configs.get(name, {})))
+    data = {"packages": [dict({"name": root, "requires": levels[0]}, **configs.get(root, {}))], "nodes": nodes}
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, sort_keys=False)
+    return path
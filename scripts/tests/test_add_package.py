@@ -0,0 +1,120 @@
+import time
+
+import yaml
+from conftest import aur_package, diamond_levels, run_script, write_diamond_manifest
+
+
+def resolve(server, tmp_path, *argv):
+    return run_script(
+        "add-package.py", *argv, "--no-cache", base_url=server.base_url, cwd=tmp_path, cache_home=tmp_path
+    )
+
+
+def test_nested_lookups_do_not_deadlock_small_pool(stub_server, tmp_path):
+    # 每个 -git 依赖的官方源检查又会并发搜索两个名称; 工作线程不能等待自己所在的线程池
+    deps = ["alpha-git", "beta-git", "gamma-git"]
+    server = stub_server(
+        aur=[aur_package("app", depends=deps + ["glibc"])] + [aur_package(name) for name in deps],
+        official=["glibc"],
+    )
+    result = resolve(server, tmp_path, "app", "-j", "2")
+    assert result.returncode == 0, result.stderr
+    for name in deps:
+        assert name in result.stdout
+
+
+def test_provides_and_official_alternatives(stub_server, tmp_path):
+    server = stub_server(
+        aur=[
+            aur_package("app", depends=["libfoo", "python"], make_depends=["helper"]),
+            aur_package("foo-bin", provides=["libfoo=2.0"]),
+            aur_package("helper"),
+        ],
+        official=["python"],
+    )
+    result = resolve(server, tmp_path, "app", "-v")
+    assert result.returncode == 0, result.stderr
+    assert "由 AUR 包 'foo-bin' 提供" in result.stdout
+    assert "依赖 'python' 由官方包 'python' 满足" in result.stdout
+    assert "helper" in result.stdout
+
+
+def test_retries_server_errors(stub_server, tmp_path):
+    server = stub_server(aur=[aur_package("app", depends=["lib"]), aur_package("lib")], fail_first=2)
+    result = resolve(server, tmp_path, "app", "--retries", "3")
+    assert result.returncode == 0, result.stderr
+    assert "lib" in result.stdout
+    assert server.state.snapshot()["failed"] == 2
+
+
+def test_failed_lookup_aborts_instead_of_not_found(stub_server, tmp_path):
+    server = stub_server(aur=[aur_package("app")], fail_first=1000)
+    result = resolve(server, tmp_path, "app", "--retries", "1")
+    assert result.returncode == 1
+    assert "网络查询失败" in result.stderr
+    assert "纯 AUR 依赖树" not in result.stdout
+
+
+def diamond_aur(depth, leaf_depends=()):
+    levels = diamond_levels(depth)
+    packages = [aur_package("app", depends=levels[0])]
+    for level, names in enumerate(levels):
+        depends = levels[level + 1] if level + 1 < depth else list(leaf_depends)
+        packages.extend(aur_package(name, depends=depends) for name in names)
+    return packages
+
+
+def test_reresolve_diamond_compact_manifest_by_edges(stub_server, tmp_path):
+    # 2^21 条路径、43 个软件包: 比较与合并都必须按包名/节点进行，而不是按路径
+    depth = 20
+    server = stub_server(aur=diamond_aur(depth, leaf_depends=["newlib"]) + [aur_package("newlib")])
+    configs = {"lib5a": {"lto": False, "dependencies": ["cmake"]}}
+    write_diamond_manifest(tmp_path / "packages.yaml", depth, configs=configs)
+
+    start = time.monotonic()
+    result = resolve(server, tmp_path, "--all", "-f", "packages.yaml")
+    assert result.returncode == 0, result.stderr
+    assert time.monotonic() - start < 20
+    changes = [line.strip() for line in result.stdout.splitlines() if line.startswith("    ")]
+    assert changes == ["+ lib19a -> newlib", "+ lib19b -> newlib"]
+
+    data = yaml.safe_load((tmp_path / "packages.yaml").read_text(encoding="utf-8"))
+    nodes = {node["name"]: node for node in data["nodes"]}
+    assert len(nodes) == 2 * depth + 1
+    assert nodes["lib19a"]["requires"] == ["newlib"]
+    assert nodes["lib5a"] == {"name": "lib5a", "dependencies": ["cmake"], "requires": ["lib6a", "lib6b"], "lto": False}
+
+    # 再次解析时没有变化
+    result = resolve(server, tmp_path, "--all", "-f", "packages.yaml")
+    assert result.returncode == 0, result.stderr
+    assert "无需更新" in result.stdout
+
+
+def test_add_to_compact_manifest_keeps_shared_node_config(stub_server, tmp_path):
+    server = stub_server(aur=[aur_package("app", depends=["libx"]), aur_package("tool", depends=["libx"]), aur_package("libx")])
+    (tmp_path / "packages.yaml").write_text(
+        "packages:\n- name: app\n  requires:\n  - libx\nnodes:\n- name: libx\n  exclude: libx-docs\n", encoding="utf-8"
+    )
+    result = resolve(server, tmp_path, "tool", "-f", "packages.yaml")
+    assert result.returncode == 0, result.stderr
+    data = yaml.safe_load((tmp_path / "packages.yaml").read_text(encoding="utf-8"))
+    assert data["packages"] == [{"name": "app", "requires": ["libx"]}, {"name": "tool", "requires": ["libx"]}]
+    assert data["nodes"] == [{"name": "libx", "exclude": "libx-docs"}]
+
+
+def test_compact_refuses_conflicting_configs(stub_server, tmp_path):
+    server = stub_server(aur=[aur_package("app-a", depends=["libx"]), aur_package("app-b", depends=["libx"]), aur_package("libx")])
+    text = """packages:
+- name: app-a
+  dependencies:
+  - name: libx
+    exclude: libx-docs
+- name: app-b
+  dependencies:
+  - name: libx
+"""
+    (tmp_path / "packages.yaml").write_text(text, encoding="utf-8")
+    result = resolve(server, tmp_path, "--all", "--compact", "-f", "packages.yaml")
+    assert result.returncode == 1
+    assert "软件包 'libx' 在多个位置的配置不同" in result.stderr
+    assert (tmp_path / "packages.yaml").read_text(encoding="utf-8") == text
@@ -0,0 +1,71 @@
+import gzip
+import json
+
+import pytest
+from conftest import aur_package, run_script
+
+PACKAGES = [
+    aur_package("app", depends=["glibc", "libfoo"], make_depends=["helper"]),
+    # 两个包都提供 libfoo，应选择更受欢迎的 foo-bin，与在线查询一致
+    aur_package("foo-git", provides=["libfoo"], popularity=0.5),
+    aur_package("foo-bin", provides=["libfoo=2.0"], popularity=3.0),
+    aur_package("helper", depends=["glibc"]),
+]
+
+
+def write_dump(path, packages, truncate=0):
+    text = json.dumps(packages)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(text[: len(text) - truncate])
+    return path
+
+
+def resolve(server, tmp_path, *argv):
+    return run_script(
+        "add-package.py", "app", "--no-cache", *argv, base_url=server.base_url, cwd=tmp_path, cache_home=tmp_path
+    )
+
+
+def test_dump_answers_info_and_provides_locally(stub_server, tmp_path):
+    dump = write_dump(tmp_path / "packages-meta-ext-v1.json.gz", PACKAGES)
+    server = stub_server(official=["glibc"])
+    result = resolve(server, tmp_path, "--aur-dump", dump)
+    assert result.returncode == 0, result.stderr
+    assert "foo-bin" in result.stdout and "helper" in result.stdout
+    assert "foo-git" not in result.stdout
+    counts = server.state.snapshot()
+    assert "aur_info" not in counts and "aur_search" not in counts
+
+
+def test_dump_and_online_pick_the_same_provider(stub_server, tmp_path):
+    dump = write_dump(tmp_path / "dump.json.gz", PACKAGES)
+    server = stub_server(aur=PACKAGES, official=["glibc"])
+    offline = resolve(server, tmp_path, "--aur-dump", dump)
+    online = resolve(server, tmp_path)
+    assert offline.returncode == online.returncode == 0, offline.stderr + online.stderr
+    tree = offline.stdout[offline.stdout.index("纯 AUR 依赖树"):]
+    assert tree == online.stdout[online.stdout.index("纯 AUR 依赖树"):]
+
+
+@pytest.mark.parametrize("content", ["", "[", '[{"Name": "app"}', '[{"Name": "app"},', "{}"])
+def test_truncated_dump_is_rejected(stub_server, tmp_path, content):
+    dump = tmp_path / "dump.json"
+    dump.write_text(content, encoding="utf-8")
+    result = resolve(stub_server(), tmp_path, "--aur-dump", dump)
+    assert result.returncode == 1
+    assert "无法读取 AUR 元数据转储" in result.stderr
+
+
+def test_truncated_gzip_dump_is_rejected(stub_server, tmp_path):
+    dump = write_dump(tmp_path / "dump.json.gz", PACKAGES, truncate=1)
+    result = resolve(stub_server(), tmp_path, "--aur-dump", dump)
+    assert result.returncode == 1
+    assert "被截断" in result.stderr
+
+
+def test_truncated_gzip_stream_is_rejected(stub_server, tmp_path):
+    dump = write_dump(tmp_path / "dump.json.gz", PACKAGES)
+    dump.write_bytes(dump.read_bytes()[:-16])
+    result = resolve(stub_server(), tmp_path, "--aur-dump", dump)
+    assert result.returncode == 1
+    assert "无法读取 AUR 元数据转储" in result.stderr
@@ -0,0 +1,69 @@
+import hashlib
+import shutil
+
+import benchmark
+import delta
+import pytest
+import zstandard
+
+pytestmark = pytest.mark.skipif(shutil.which("zstd") is None, reason="需要 zstd 命令")
+
+
+def make(tmp_path, version, seed=0):
+    path = tmp_path / f"app-{version}-x86_64.pkg.tar.zst"
+    # 相同的 seed 生成相同的负载，只有 .PKGINFO 中的版本号不同
+    benchmark.make_package(path, "app", version, 256 * 1024, seed=seed)
+    return path
+
+
+def sha256(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def test_create_and_apply_round_trip(tmp_path):
+    base, new = make(tmp_path, "1.0-1"), make(tmp_path, "1.1-1")
+    delta_path = tmp_path / f"{new.name}{delta.DELTA_SUFFIX}"
+    info = delta.create_delta(str(new), str(base), str(delta_path))
+    assert info is not None
+    assert info["size"] == delta_path.stat().st_size < new.stat().st_size * delta.DEFAULT_MAX_RATIO
+    assert info["base_sha256"] == sha256(base)
+
+    restored = tmp_path / "restored.pkg.tar"
+    delta.apply_delta(
+        str(base), str(delta_path), str(restored), info["window_log"], info["target_sha256"], info["base_sha256"]
+    )
+    # 还原出的是未压缩的 .pkg.tar，target_sha256 是它的哈希，而不是 .pkg.tar.zst 的哈希
+    assert restored.read_bytes() == zstandard.ZstdDecompressor().decompressobj().decompress(new.read_bytes())
+    assert info["target_sha256"] == sha256(restored) != sha256(new)
+
+
+def test_apply_rejects_wrong_base(tmp_path):
+    base, new = make(tmp_path, "1.0-1"), make(tmp_path, "1.1-1")
+    other = make(tmp_path, "0.9-1", seed=1)
+    delta_path = tmp_path / "app.delta"
+    info = delta.create_delta(str(new), str(base), str(delta_path))
+
+    restored = tmp_path / "restored.pkg.tar"
+    with pytest.raises(delta.DeltaError, match="is not the base"):
+        delta.apply_delta(
+            str(other), str(delta_path), str(restored), info["window_log"], info["target_sha256"], info["base_sha256"]
+        )
+    assert not restored.exists()
+
+
+def test_apply_rejects_sha256_mismatch(tmp_path):
+    base, new = make(tmp_path, "1.0-1"), make(tmp_path, "1.1-1")
+    delta_path = tmp_path / "app.delta"
+    info = delta.create_delta(str(new), str(base), str(delta_path))
+
+    restored = tmp_path / "restored.pkg.tar"
+    with pytest.raises(delta.DeltaError, match="does not match"):
+        delta.apply_delta(str(base), str(delta_path), str(restored), info["window_log"], "0" * 64)
+    assert not restored.exists()
+
+
+def test_delta_not_smaller_than_package_is_dropped(tmp_path):
+    base, new = make(tmp_path, "1.0-1"), make(tmp_path, "1.1-1", seed=1)
+    delta_path = tmp_path / "app.delta"
+    assert delta.create_delta(str(new), str(base), str(delta_path)) is None
+    assert not delta_path.exists()
@@ -0,0 +1,103 @@
+import json
+import time
+
+import pytest
+from conftest import diamond_levels, run_script, write_diamond_manifest, write_json
+
+HEAD = "abcdef1234567890abcdef1234567890abcdef12"
+
+
+def plan(tmp_path, published_version, head=HEAD, name="tool-git"):
+    (tmp_path / "packages.yaml").write_text(f"packages:\n  - name: {name}\n", encoding="utf-8")
+    write_json(tmp_path / "published.json", [{"name": name, "version": published_version}])
+    write_json(
+        tmp_path / "aur.json",
+        {"results": [{"Name": name, "PackageBase": name, "Version": "r1.0000000-1"}], "vcs_heads": {name: head}},
+    )
+    result = run_script(
+        "list-tasks.py", "packages.yaml", "--lto",
+        "--published", "published.json", "--aur-fixture", "aur.json", "--plan-report", "plan.json",
+        cwd=tmp_path,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads((tmp_path / "plan.json").read_text(encoding="utf-8"))[0]["reason"]
+
+
+@pytest.mark.parametrize(
+    "version",
+    [
+        "r123.abcdef1-1",
+        "1.2.r3.gabcdef1-1",
+        # 日期或纯数字的版本段不能被当作提交哈希
+        "20240101.r5.gabcdef1-1",
+        "25.1234567.r3.gabcdef1-1",
+        "1:20240101.r5.gabcdef123-2",
+    ],
+)
+def test_vcs_package_at_upstream_head_is_skipped(tmp_path, version):
+    assert plan(tmp_path, version) == "vcs-unchanged"
+
+
+def test_g_prefixed_numeric_hash(tmp_path):
+    assert plan(tmp_path, "r5.g1234567-1", head="1234567" + "0" * 33) == "vcs-unchanged"
+
+
+@pytest.mark.parametrize("version", ["20240101.r5.g7654321-1", "r123.fedcba9-1"])
+def test_vcs_package_behind_upstream_is_rebuilt(tmp_path, version):
+    assert plan(tmp_path, version) == "vcs-updated"
+
+
+@pytest.mark.parametrize("version", ["20240101-1", "25.1234567-1"])
+def test_vcs_version_without_hash_is_unknown(tmp_path, version):
+    assert plan(tmp_path, version) == "vcs-unknown"
+
+
+def test_waves_list_shared_dependencies_once(tmp_path):
+    (tmp_path / "packages.yaml").write_text(
+        """packages:
+  - name: app-a
+    dependencies:
+      - name: libshared
+        dependencies:
+          - name: libbase
+      - cmake
+  - name: app-b
+    dependencies:
+      - name: libshared
+        dependencies:
+          - name: libbase
+""",
+        encoding="utf-8",
+    )
+    result = run_script("list-tasks.py", "packages.yaml", "--lto", "--waves", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    waves = json.loads(result.stdout)
+    assert [[item["name"] for item in wave] for wave in waves] == [["libbase"], ["libshared"], ["app-a", "app-b"]]
+    # AUR 子依赖已在更早的波次中构建，条目中只保留手写的额外依赖
+    assert {item["name"]: item["dependencies"] for item in waves[-1]} == {"app-a": "cmake", "app-b": ""}
+    assert waves[1][0]["dependencies"] == ""
+
+
+def test_waves_on_diamond_compact_manifest_expand_each_node_once(tmp_path):
+    # 紧凑清单展开后共享节点对象，路径数 (2^30) 远多于软件包数，不能按路径展开
+    depth = 30
+    write_diamond_manifest(tmp_path / "packages.yaml", depth, configs={"lib3a": {"lto": False}})
+    start = time.monotonic()
+    result = run_script("list-tasks.py", "packages.yaml", "--lto", "--waves", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert time.monotonic() - start < 10
+    waves = [[item["name"] for item in wave] for wave in json.loads(result.stdout)]
+    expected = [names for names in reversed(diamond_levels(depth))] + [["app"]]
+    expected[depth - 1 - 3] = ["lib3b"]
+    assert waves == expected
+
+
+def test_recursive_listing_of_diamond_compact_manifest(tmp_path):
+    depth = 30
+    write_diamond_manifest(tmp_path / "packages.yaml", depth)
+    start = time.monotonic()
+    result = run_script("list-tasks.py", "packages.yaml", "--lto", "--recursive", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert time.monotonic() - start < 10
+    names = [item["name"] for item in json.loads(result.stdout)]
+    assert sorted(names) == sorted(["app"] + [name for names in diamond_levels(depth) for name in names])
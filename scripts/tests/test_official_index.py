@@ -0,0 +1,47 @@
+import repodb
+from conftest import aur_package, run_script
+
+
+def write_sync_db(directory, repo, packages):
+    """写出一个同步数据库，packages 为 (包名, provides, conflicts) 列表"""
+    entries = [
+        {"desc": {"NAME": [name], "VERSION": ["1.0-1"], "PROVIDES": list(provides), "CONFLICTS": list(conflicts)}}
+        for name, provides, conflicts in packages
+    ]
+    repodb.write_db(str(directory / f"{repo}.db"), entries, mtime=0)
+
+
+def test_sync_db_index_resolves_offline(stub_server, tmp_path):
+    sync = tmp_path / "sync"
+    sync.mkdir()
+    write_sync_db(sync, "core", [("glibc", [], []), ("libcore", ["libcore.so=1-64"], [])])
+    write_sync_db(sync, "extra", [("python", [], []), ("fancy", [], ["fancy-git"])])
+    write_sync_db(sync, "archlinuxcn", [("cn-tool", ["cn-virtual=2"], [])])
+    # 本机启用了本仓库时，our.db 中的包不能被当作官方替代品
+    write_sync_db(sync, "our", [("rocm-nightly-bin", [], []), ("app", [], [])])
+
+    deps = ["glibc", "libcore.so", "python", "fancy-git", "cn-virtual", "rocm-nightly-bin"]
+    server = stub_server(aur=[aur_package("app", depends=deps), aur_package("rocm-nightly-bin")])
+    result = run_script(
+        "add-package.py", "app", "-v", "--no-cache", "--sync-db-dir", sync,
+        base_url=server.base_url, cwd=tmp_path, cache_home=tmp_path,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "忽略非官方仓库 'our'" in result.stdout
+    for dep, owner in [("libcore.so", "libcore"), ("fancy-git", "fancy"), ("cn-virtual", "cn-tool")]:
+        assert f"依赖 '{dep}' 由官方包 '{owner}' 满足" in result.stdout
+    assert "发现纯 AUR 依赖: 'rocm-nightly-bin'" in result.stdout
+    assert "official_search" not in server.state.snapshot()
+
+
+def test_sync_db_index_without_conflicts(stub_server, tmp_path):
+    sync = tmp_path / "sync"
+    sync.mkdir()
+    write_sync_db(sync, "extra", [("fancy", [], ["fancy-legacy"])])
+    server = stub_server(aur=[aur_package("app", depends=["fancy-legacy"]), aur_package("fancy-legacy")])
+    result = run_script(
+        "add-package.py", "app", "-v", "--no-cache", "--sync-db-dir", sync, "--no-match-conflicts",
+        base_url=server.base_url, cwd=tmp_path, cache_home=tmp_path,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "发现纯 AUR 依赖: 'fancy-legacy'" in result.stdout
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+import benchmark
+import repodb
+from conftest import run_script
+
+
+def make_repo(tmp_path, *names):
+    repo_dir = tmp_path / "x86_64"
+    repo_dir.mkdir()
+    for i, name in enumerate(names):
+        benchmark.make_package(repo_dir / f"{name}-1.0-1-x86_64.pkg.tar.zst", name, "1.0-1", 4096, seed=i)
+    return repo_dir
+
+
+def test_verify_accepts_unsigned_packages_without_sign(tmp_path):
+    repo_dir = make_repo(tmp_path, "alpha")
+    result = run_script("repo-update.py", "our", "--dir", repo_dir, "--verify", "-j", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (repo_dir / "our.db").exists()
+
+
+def test_verify_rejects_missing_signature_when_signing(tmp_path):
+    repo_dir = make_repo(tmp_path, "alpha", "beta")
+    result = run_script("repo-update.py", "our", "--dir", repo_dir, "--verify", "--sign", "-j", "1")
+    assert result.returncode == 1
+    assert "Missing signature for 'alpha-1.0-1-x86_64.pkg.tar.zst'" in result.stdout
+    assert "Missing signature for 'beta-1.0-1-x86_64.pkg.tar.zst'" in result.stdout
+    assert not (repo_dir / "our.db").exists()
+
+
+def db_sha256(repo_dir):
+    return {
+        entry["desc"]["NAME"][0]: entry["desc"]["SHA256SUM"][0]
+        for entry in repodb.iter_db_entries(str(repo_dir / "our.db.tar.gz"))
+    }
+
+
+def test_same_size_rebuild_is_rescanned(tmp_path):
+    repo_dir = make_repo(tmp_path, "alpha", "beta")
+    result = run_script("repo-update.py", "our", "--dir", repo_dir, "-j", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+    before = db_sha256(repo_dir)
+
+    # 同一版本重新构建: 文件名和压缩后大小都不变，内容不同，且晚于数据库写入
+    rebuilt = repo_dir / "alpha-1.0-1-x86_64.pkg.tar.zst"
+    size = rebuilt.stat().st_size
+    candidate = tmp_path / rebuilt.name
+    for seed in range(1, 1000):
+        benchmark.make_package(candidate, "alpha", "1.0-1", 4096, seed=seed)
+        if candidate.stat().st_size == size:
+            break
+    assert candidate.stat().st_size == size
+    candidate.replace(rebuilt)
+    db_mtime = (repo_dir / "our.files.tar.gz").stat().st_mtime_ns
+    os.utime(rebuilt, ns=(db_mtime + 10**9, db_mtime + 10**9))
+
+    result = run_script("repo-update.py", "our", "--dir", repo_dir, "-j", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "1 unchanged package(s), scanning 1 new package(s)" in result.stdout
+    after = db_sha256(repo_dir)
+    assert after["beta"] == before["beta"]
+    assert after["alpha"] == hashlib.sha256(rebuilt.read_bytes()).hexdigest() != before["alpha"]
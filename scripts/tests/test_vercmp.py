@@ -0,0 +1,104 @@
+import pytest
+
+import vercmp
+
+# pacman 的 test/util/vercmptest.sh 中的测试向量
+PACMAN_VECTORS = [
+    # 长度相同，不含 pkgrel
+    ("1.5.0", "1.5.0", 0),
+    ("1.5.1", "1.5.0", 1),
+    # 长度不同
+    ("1.5.1", "1.5", 1),
+    # 含 pkgrel
+    ("1.5.0-1", "1.5.0-1", 0),
+    ("1.5.0-1", "1.5.0-2", -1),
+    ("1.5.0-1", "1.5.1-1", -1),
+    ("1.5.0-2", "1.5.1-1", -1),
+    ("1.5-1", "1.5.1-1", -1),
+    ("1.5-2", "1.5.1-1", -1),
+    ("1.5-2", "1.5.1-2", -1),
+    # 只有一方含 pkgrel
+    ("1.5", "1.5-1", 0),
+    ("1.5-1", "1.5", 0),
+    ("1.1-1", "1.1", 0),
+    ("1.0-1", "1.1", -1),
+    ("1.1-1", "1.0", 1),
+    # 字母数字混合
+    ("1.5b-1", "1.5-1", -1),
+    ("1.5b", "1.5", -1),
+    ("1.5b-1", "1.5", -1),
+    ("1.5b", "1.5.1", -1),
+    # vercmp 手册中的例子
+    ("1.0a", "1.0alpha", -1),
+    ("1.0alpha", "1.0b", -1),
+    ("1.0b", "1.0beta", -1),
+    ("1.0beta", "1.0rc", -1),
+    ("1.0rc", "1.0", -1),
+    # 点号分隔的字母段
+    ("1.5.a", "1.5", 1),
+    ("1.5.b", "1.5.a", 1),
+    ("1.5.1", "1.5.b", 1),
+    ("1.5.b-1", "1.5.b", 0),
+    ("1.5-1", "1.5.b", -1),
+    # 内容相同但分隔符不同
+    ("2.0", "2_0", 0),
+    ("2.0_a", "2_0.a", 0),
+    ("2.0a", "2.0.a", -1),
+    ("2___a", "2_a", 1),
+    # epoch
+    ("0:1.0", "0:1.0", 0),
+    ("0:1.0", "0:1.1", -1),
+    ("1:1.0", "0:1.0", 1),
+    ("1:1.0", "0:1.1", 1),
+    ("1:1.0", "2:1.1", -1),
+    ("1:1.0", "0:1.0-1", 1),
+    ("1:1.0-1", "0:1.1-1", 1),
+    ("0:1.0", "1.0", 0),
+    ("0:1.0", "1.1", -1),
+    ("0:1.1", "1.0", 1),
+    ("1:1.0", "1.0", 1),
+    ("1:1.0", "1.1", 1),
+    ("1:1.1", "1.1", 1),
+]
+
+
+@pytest.mark.parametrize("a, b, expected", PACMAN_VECTORS)
+def test_pacman_vectors(a, b, expected):
+    # 与 vercmptest.sh 一样，交换参数后结果取反
+    assert vercmp.vercmp(a, b) == expected
+    assert vercmp.vercmp(b, a) == -expected
+
+
+def test_parse_package_filename():
+    assert vercmp.parse_package_filename("foo-bar-1.2.3-4-x86_64.pkg.tar.zst") == ("foo-bar", "1.2.3-4", "x86_64")
+    # entrypoint.sh 把 epoch 的冒号改写为下划线
+    assert vercmp.parse_package_filename("foo-1_2.0-1-any.pkg.tar.zst") == ("foo", "1:2.0-1", "any")
+    assert vercmp.parse_package_filename("foo-1.0-1-x86_64.pkg.tar.zst.sig") is None
+    assert vercmp.parse_package_filename("not-a-package.txt") is None
+
+
+def test_underscore_pkgver_orders_like_pacman():
+    # 已知局限: 2_10 被读作 epoch 2，但同一形式的版本之间顺序与按 pkgver 比较一致
+    versions = ["2_9", "2_10", "3_1", "2_10.1"]
+    from_filenames = [vercmp.parse_package_filename(f"foo-{v}-1-any.pkg.tar.zst")[1] for v in versions]
+    assert sorted(from_filenames, key=vercmp.version_key) == ["2:9-1", "2:10-1", "2:10.1-1", "3:1-1"]
+    assert sorted(versions, key=vercmp.version_key) == ["2_9", "2_10", "2_10.1", "3_1"]
+
+
+def test_prune_keeps_newest_per_package():
+    filenames = [
+        "foo-1.0-1-x86_64.pkg.tar.zst",
+        "foo-1.0-2-x86_64.pkg.tar.zst",
+        "foo-1_0.5-1-x86_64.pkg.tar.zst",
+        "bar-2.0rc1-1-any.pkg.tar.zst",
+        "bar-2.0-1-any.pkg.tar.zst",
+        "bar-2.0-1-x86_64.pkg.tar.zst",
+    ]
+    kept, pruned = vercmp.prune(filenames, keep=1)
+    assert kept == ["foo-1_0.5-1-x86_64.pkg.tar.zst", "bar-2.0-1-any.pkg.tar.zst", "bar-2.0-1-x86_64.pkg.tar.zst"]
+    assert pruned == [
+        "foo-1.0-1-x86_64.pkg.tar.zst",
+        "foo-1.0-2-x86_64.pkg.tar.zst",
+        "bar-2.0rc1-1-any.pkg.tar.zst",
+    ]
+    assert vercmp.prune(filenames, keep=2)[1] == ["foo-1.0-1-x86_64.pkg.tar.zst"]
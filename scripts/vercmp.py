@@ -0,0 +1,205 @@
+"""
+pacman 版本比较 (vercmp) 的纯 Python 实现，以及按版本清理重复软件包的工具函数。
+
+比较规则与 libalpm 的 alpm_pkg_vercmp 一致:
+版本号形如 [epoch:]pkgver[-pkgrel]，依次比较 epoch、pkgver、pkgrel (双方都有 pkgrel 时)。
+pkgver 和 pkgrel 按 rpmvercmp 的规则拆分为数字段和字母段逐段比较:
+数字段按数值比较，数字段总是比字母段新，"1.0" 比 "1.0a" 新，但比 "1.0.1" 旧。
+
+既可以作为模块导入，也可以像 pacman 的 vercmp 命令一样使用:
+    python scripts/vercmp.py 1.0-1 1:0.9-1    # 输出 -1
+"""
+
+import re
+import sys
+from functools import cmp_to_key
+
+# pacman 软件包文件的后缀，用于从文件名中解析版本
+PKG_SUFFIXES = (".pkg.tar.zst", ".pkg.tar.xz", ".pkg.tar.gz", ".pkg.tar.bz2", ".pkg.tar")
+# entrypoint.sh 会把文件名中的冒号替换为下划线，epoch "1:" 在文件名中变为 "1_"。
+# 仅凭文件名无法区分改写过的 epoch 和本身以 "<数字>_" 开头的 pkgver (如 2_10)，见 parse_package_filename
+RENAMED_EPOCH_RE = re.compile(r"^(\d+)_")
+
+
+def _isalnum(ch):
+    # 与 C 的 isalnum 一致，只认 ASCII 字母和数字
+    return ch.isascii() and ch.isalnum()
+
+
+def _isdigit(ch):
+    return "0" <= ch <= "9"
+
+
+def _isalpha(ch):
+    return ch.isascii() and ch.isalpha()
+
+
+def rpmvercmp(a, b):
+    """按 rpmvercmp 规则比较两个版本片段，返回 -1、0 或 1"""
+    if a == b:
+        return 0
+
+    one = two = 0
+    len_a, len_b = len(a), len(b)
+    while one < len_a and two < len_b:
+        # 跳过分隔符，分隔符长度不同时分隔符更长的一方更新
+        sep1, sep2 = one, two
+        while one < len_a and not _isalnum(a[one]):
+            one += 1
+        while two < len_b and not _isalnum(b[two]):
+            two += 1
+        if one >= len_a or two >= len_b:
+            break
+        if one - sep1 != two - sep2:
+            return -1 if one - sep1 < two - sep2 else 1
+
+        # 截取同类型的一段: 全部数字或全部字母
+        end1, end2 = one, two
+        is_num = _isdigit(a[one])
+        match = _isdigit if is_num else _isalpha
+        while end1 < len_a and match(a[end1]):
+            end1 += 1
+        while end2 < len_b and match(b[end2]):
+            end2 += 1
+
+        seg1, seg2 = a[one:end1], b[two:end2]
+        # 类型不同: 数字段比字母段新
+        if not seg2:
+            return 1 if is_num else -1
+
+        if is_num:
+            seg1, seg2 = seg1.lstrip("0"), seg2.lstrip("0")
+            if len(seg1) != len(seg2):
+                return 1 if len(seg1) > len(seg2) else -1
+        if seg1 != seg2:
+            return -1 if seg1 < seg2 else 1
+        one, two = end1, end2
+
+    rest1, rest2 = a[one:], b[two:]
+    if not rest1 and not rest2:
+        return 0
+    # 剩余的字母段永远不比空串新: "1.0a" < "1.0"，而 "1.0.1" > "1.0"
+    if (not rest1 and not _isalpha(rest2[0])) or (rest1 and _isalpha(rest1[0])):
+        return -1
+    return 1
+
+
+def parse_evr(version):
+    """
+    将版本号拆分为 (epoch, pkgver, pkgrel)。
+
+    没有 epoch 时为 "0"，没有 pkgrel 时为 None，与 libalpm 的 parseEVR 一致。
+    """
+    digits = 0
+    while digits < len(version) and _isdigit(version[digits]):
+        digits += 1
+    if digits < len(version) and version[digits] == ":":
+        epoch = version[:digits] or "0"
+        rest = version[digits + 1 :]
+    else:
+        epoch, rest = "0", version
+    pkgver, sep, pkgrel = rest.rpartition("-")
+    if not sep:
+        return epoch, rest, None
+    return epoch, pkgver, pkgrel
+
+
+def vercmp(a, b):
+    """
+    比较两个完整版本号。
+
+    Returns:
+        int: a 比 b 旧时返回 -1，相同返回 0，更新返回 1。
+    """
+    if a == b:
+        return 0
+    epoch1, ver1, rel1 = parse_evr(a)
+    epoch2, ver2, rel2 = parse_evr(b)
+    ret = rpmvercmp(epoch1, epoch2)
+    if ret == 0:
+        ret = rpmvercmp(ver1, ver2)
+        if ret == 0 and rel1 is not None and rel2 is not None:
+            ret = rpmvercmp(rel1, rel2)
+    return ret
+
+
+# 用于 sorted(..., key=version_key)，按版本从旧到新排序
+version_key = cmp_to_key(vercmp)
+
+
+def parse_package_filename(filename):
+    """
+    从软件包文件名 <pkgname>-<pkgver>-<pkgrel>-<arch>.pkg.tar.* 中解析元数据。
+
+    被 entrypoint.sh 改写为 "<epoch>_" 的 epoch 会还原为 "<epoch>:"。
+
+    局限: 本身以 "<数字>_" 开头的 pkgver (如 2_10) 也会被当作 epoch (2:10)。
+    同一软件包的各个版本都是这种形式时，rpmvercmp 本就把 "_" 视为分隔符，比较结果不受影响；
+    只有上游在两种形式之间切换时 (如 2_10 与 3)，prune 才可能保留错误的文件。
+    需要准确版本时应使用 .PKGINFO 或数据库中的版本号 (repo-update.py 写入数据库的条目即是如此)。
+
+    Returns:
+        tuple | None: (pkgname, 版本号, arch)，文件名不符合格式时返回 None。
+    """
+    for suffix in PKG_SUFFIXES:
+        if filename.endswith(suffix):
+            stem = filename[: -len(suffix)]
+            break
+    else:
+        return None
+    parts = stem.rsplit("-", 3)
+    if len(parts) != 4 or not all(parts):
+        return None
+    pkgname, pkgver, pkgrel, arch = parts
+    pkgver = RENAMED_EPOCH_RE.sub(r"\1:", pkgver)
+    return pkgname, f"{pkgver}-{pkgrel}", arch
+
+
+def group_by_package(items, key=parse_package_filename):
+    """
+    一次遍历将软件包按 (pkgname, arch) 分组，组内按版本从新到旧排序。
+
+    Args:
+        items (iterable): 文件名，或任意可由 key 解析出 (pkgname, 版本号, arch) 的对象。
+        key (callable): 解析函数，返回 None 的项会被忽略。
+
+    Returns:
+        dict: (pkgname, arch) 到 [(版本号, 原始项), ...] 的映射。
+    """
+    groups = {}
+    for item in items:
+        parsed = key(item)
+        if parsed is None:
+            continue
+        pkgname, version, arch = parsed
+        groups.setdefault((pkgname, arch), []).append((version, item))
+    for versions in groups.values():
+        if len(versions) > 1:
+            versions.sort(key=lambda pair: version_key(pair[0]), reverse=True)
+    return groups
+
+
+def prune(filenames, keep=1):
+    """
+    每个软件包只保留最新的 keep 个版本。
+
+    Returns:
+        tuple: (保留的文件名列表, 应删除的文件名列表)，均按输入中出现的顺序排列。
+    """
+    pruned = set()
+    for versions in group_by_package(filenames).values():
+        pruned.update(filename for _, filename in versions[keep:])
+    kept = [f for f in filenames if f not in pruned]
+    return kept, [f for f in filenames if f in pruned]
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("usage: vercmp.py <ver1> <ver2>", file=sys.stderr)
+        print("output: < 0 : if ver1 < ver2\n          0 : if ver1 == ver2\n        > 0 : if ver1 > ver2", file=sys.stderr)
+        sys.exit(1)
+    print(vercmp(sys.argv[1], sys.argv[2]))
+
+
+if __name__ == "__main__":
+    main()